@@ -1,17 +1,37 @@
+import importlib
+import typing
+
 __version__ = "0.0.1"
 
-from . import (
-    database,
-    exceptions,
-    mail,
-    middleware,
-    paginator,
-    templating,
-    testing,
-    utils,
-)
 from .config import config
 
+# submodules are imported on first use, so importing the package doesn't
+# import sqlalchemy, jinja2 and wtforms unless they are needed
+_submodules = {
+    "cache",
+    "database",
+    "exceptions",
+    "mail",
+    "middleware",
+    "monitoring",
+    "paginator",
+    "routing",
+    "templating",
+    "testing",
+    "utils",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    if name in _submodules:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> typing.List[str]:
+    return sorted([*globals(), *_submodules])
+
+
 __all__ = [
     "config",
     "database",
@@ -0,0 +1,131 @@
+import collections
+import pickle
+import threading
+import time
+import typing
+
+DEFAULT_TIMEOUT = object()
+
+
+class BaseCache:
+    """
+    Base class for cache implementations.
+    Subclasses must at least overwrite get(), set(), delete() and clear().
+    ``timeout`` is the number of seconds a value is kept for, ``None``
+    keeps it until evicted.
+    """
+
+    def __init__(self, default_timeout: typing.Optional[int] = 300) -> None:
+        self.default_timeout = default_timeout
+        self.hits = 0
+        self.misses = 0
+
+    def get_timeout(self, timeout: typing.Any) -> typing.Optional[int]:
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        raise NotImplementedError("subclasses of BaseCache must override get()")
+
+    def set(self, key: str, value: typing.Any, timeout: typing.Any = DEFAULT_TIMEOUT):
+        raise NotImplementedError("subclasses of BaseCache must override set()")
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError("subclasses of BaseCache must override delete()")
+
+    def clear(self) -> None:
+        raise NotImplementedError("subclasses of BaseCache must override clear()")
+
+
+class LocMemCache(BaseCache):
+    """
+    A thread safe in-process cache. Once ``max_entries`` is reached the least
+    recently used key is evicted.
+    """
+
+    def __init__(
+        self, max_entries: int = 1000, default_timeout: typing.Optional[int] = 300
+    ) -> None:
+        super().__init__(default_timeout=default_timeout)
+        self.max_entries = max_entries
+        self._data: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: typing.Any, timeout: typing.Any = DEFAULT_TIMEOUT):
+        timeout = self.get_timeout(timeout)
+        expires = None if timeout is None else time.monotonic() + timeout
+
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCache(BaseCache):
+    """
+    A cache kept in Redis, shared between processes. ``client`` is a
+    ``redis.Redis`` or any client with the same ``get``, ``set``, ``delete``
+    and ``scan_iter`` methods. Values are pickled and keys are prefixed with
+    ``key_prefix``, which is also what clear() deletes.
+    """
+
+    def __init__(
+        self,
+        client: typing.Any,
+        key_prefix: str = "starlette_core:",
+        default_timeout: typing.Optional[int] = 300,
+    ) -> None:
+        super().__init__(default_timeout=default_timeout)
+        self.client = client
+        self.key_prefix = key_prefix
+
+    def make_key(self, key: str) -> str:
+        return self.key_prefix + key
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        value = self.client.get(self.make_key(key))
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(value)
+
+    def set(self, key: str, value: typing.Any, timeout: typing.Any = DEFAULT_TIMEOUT):
+        timeout = self.get_timeout(timeout)
+        self.client.set(self.make_key(key), pickle.dumps(value), ex=timeout)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.make_key(key))
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.key_prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
@@ -1,26 +1,198 @@
-from starlette.config import Config
+import typing
+
+from starlette.config import Config, environ, undefined
 from starlette.datastructures import CommaSeparatedStrings, Secret
 
+T = typing.TypeVar("T")
+
+
+def database_url(value: str) -> typing.Any:
+    # imported when first read, as importing the database imports sqlalchemy
+    from .database import DatabaseURL
+
+    return DatabaseURL(value)
+
+
+class Setting(typing.Generic[T]):
+    """
+    A setting read from the environment or ``.env`` file. It is only read and
+    cast the first time it's used, after which the value is kept.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        cast: typing.Optional[typing.Callable[[typing.Any], T]] = None,
+        default: typing.Any = undefined,
+    ) -> None:
+        self.key = key
+        self.cast = cast
+        self.default = default
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    @typing.overload
+    def __get__(self, instance: None, owner: type) -> "Setting[T]":
+        pass
+
+    @typing.overload
+    def __get__(self, instance: "Settings", owner: type) -> T:
+        pass
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return instance._values[self.name]
+        except KeyError:
+            value = instance._source(self.key, cast=self.cast, default=self.default)
+            instance._values[self.name] = value
+            return value
 
-class AppConfig:
-    _config = Config(".env")
+    def __set__(self, instance: "Settings", value: T) -> None:
+        # set in code, used instead of the environment until reloaded
+        instance._values[self.name] = value
 
+
+class Settings:
+    """
+    A group of settings, declared as `Setting` class attributes. Values can
+    be set in code, but a setting must be declared to be set.
+    """
+
+    __slots__ = ("_env_file", "_environ", "_source", "_values")
+
+    def __init__(
+        self,
+        env_file: typing.Optional[str] = ".env",
+        environ: typing.Mapping[str, str] = environ,
+        source: typing.Optional[Config] = None,
+    ) -> None:
+        self._env_file = env_file
+        self._environ = environ
+        self._source = source or Config(env_file, environ=environ)
+        self._values: typing.Dict[str, typing.Any] = {}
+
+    def reload(self) -> None:
+        """Read the ``.env`` file again and forget every value read or set."""
+
+        self._source = Config(self._env_file, environ=self._environ)
+        self._values.clear()
+
+
+class AppConfig(Settings):
+    __slots__ = ("_sections",)
+
+    # settings for subsystems added with `register_section`
+    sections: typing.Dict[str, typing.Type[Settings]] = {}
+
+    # database configuration
+    database_url: Setting[typing.Any] = Setting(
+        "DATABASE_URL", cast=database_url, default=None
+    )
+    database_replica_urls: Setting[CommaSeparatedStrings] = Setting(
+        "DATABASE_REPLICA_URLS", cast=CommaSeparatedStrings, default=[]
+    )
+    database_pool_size: Setting[int] = Setting(
+        "DATABASE_POOL_SIZE", cast=int, default=5
+    )
+    database_max_overflow: Setting[int] = Setting(
+        "DATABASE_MAX_OVERFLOW", cast=int, default=10
+    )
+    database_pool_recycle: Setting[int] = Setting(
+        "DATABASE_POOL_RECYCLE", cast=int, default=-1
+    )
+    database_pool_pre_ping: Setting[bool] = Setting(
+        "DATABASE_POOL_PRE_PING", cast=bool, default=False
+    )
+    database_statement_timeout: Setting[typing.Optional[int]] = Setting(
+        "DATABASE_STATEMENT_TIMEOUT", cast=int, default=None
+    )
+    database_echo: Setting[bool] = Setting("DATABASE_ECHO", cast=bool, default=False)
     # email configuration
-    email_backend: str = _config(
+    email_backend: Setting[str] = Setting(
         "EMAIL_BACKEND", default="starlette_core.mail.backends.smtp.EmailBackend"
     )
-    email_default_from_address = _config("EMAIL_DEFAULT_FROM_ADDRESS", default="")
-    email_default_from_name = _config("EMAIL_DEFAULT_FROM_NAME", default="")
-    email_host = _config("EMAIL_HOST", default="")
-    email_port = _config("EMAIL_PORT", cast=int, default=None)
-    email_username = _config("EMAIL_USERNAME", default="")
-    email_password = _config("EMAIL_PASSWORD", cast=Secret, default="")
-    email_use_tls = _config("EMAIL_USE_TLS", cast=bool, default=False)
-    email_timeout = _config("EMAIL_TIMEOUT", cast=int, default=None)
+    email_default_from_address: Setting[str] = Setting(
+        "EMAIL_DEFAULT_FROM_ADDRESS", default=""
+    )
+    email_default_from_name: Setting[str] = Setting(
+        "EMAIL_DEFAULT_FROM_NAME", default=""
+    )
+    email_host: Setting[str] = Setting("EMAIL_HOST", default="")
+    email_port: Setting[typing.Optional[int]] = Setting(
+        "EMAIL_PORT", cast=int, default=None
+    )
+    email_username: Setting[str] = Setting("EMAIL_USERNAME", default="")
+    email_password: Setting[Secret] = Setting("EMAIL_PASSWORD", cast=Secret, default="")
+    email_use_tls: Setting[bool] = Setting("EMAIL_USE_TLS", cast=bool, default=False)
+    email_timeout: Setting[typing.Optional[int]] = Setting(
+        "EMAIL_TIMEOUT", cast=int, default=None
+    )
+    email_pool_size: Setting[int] = Setting("EMAIL_POOL_SIZE", cast=int, default=4)
+    email_pool_keepalive: Setting[int] = Setting(
+        "EMAIL_POOL_KEEPALIVE", cast=int, default=30
+    )
+    email_queue_backend: Setting[str] = Setting(
+        "EMAIL_QUEUE_BACKEND", default="starlette_core.mail.backends.smtp.EmailBackend"
+    )
+    email_queue_size: Setting[int] = Setting("EMAIL_QUEUE_SIZE", cast=int, default=1000)
+    email_queue_path: Setting[str] = Setting("EMAIL_QUEUE_PATH", default="")
+    email_queue_batch_size: Setting[int] = Setting(
+        "EMAIL_QUEUE_BATCH_SIZE", cast=int, default=50
+    )
+    email_queue_max_retries: Setting[int] = Setting(
+        "EMAIL_QUEUE_MAX_RETRIES", cast=int, default=5
+    )
+    email_file_path: Setting[str] = Setting("EMAIL_FILE_PATH", default="mail.mbox")
+    email_file_max_bytes: Setting[int] = Setting(
+        "EMAIL_FILE_MAX_BYTES", cast=int, default=10485760
+    )
+    # messages configuration
+    messages_storage: Setting[str] = Setting(
+        "MESSAGES_STORAGE", default="starlette_core.messages.SessionStorage"
+    )
     # templating configuration
-    jinja2_extensions = _config(
+    jinja2_extensions: Setting[CommaSeparatedStrings] = Setting(
         "JINJA2_EXTENSIONS", cast=CommaSeparatedStrings, default=[]
     )
+    jinja2_bytecode_cache: Setting[str] = Setting("JINJA2_BYTECODE_CACHE", default="")
+    jinja2_bytecode_cache_dir: Setting[str] = Setting(
+        "JINJA2_BYTECODE_CACHE_DIR", default=""
+    )
+
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._sections: typing.Dict[str, Settings] = {}
+
+    @classmethod
+    def register_section(
+        cls, name: str, section: typing.Type[Settings]
+    ) -> typing.Type[Settings]:
+        """
+        Add a group of settings, available as ``config.<name>``. They are read
+        from the same environment and ``.env`` file, and not until used.
+        """
+
+        cls.sections[name] = section
+        return section
+
+    def __getattr__(self, name: str) -> typing.Any:
+        # only called for names that aren't settings
+        try:
+            section = self.sections[name]
+        except KeyError:
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {name!r}"
+            ) from None
+        if name not in self._sections:
+            self._sections[name] = section(source=self._source)
+        return self._sections[name]
+
+    def reload(self) -> None:
+        super().reload()
+        self._sections.clear()
 
 
 config = AppConfig()
@@ -1,18 +1,162 @@
+import asyncio
 import contextlib
+import contextvars
+import functools
+import itertools
+import threading
 import typing
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
 from urllib.parse import SplitResult, parse_qsl, urlsplit
 
 import sqlalchemy as sa
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import as_declarative, declared_attr
-from sqlalchemy.orm import Query, scoped_session, sessionmaker
+from sqlalchemy.orm import Query, Session as OrmSession, scoped_session, sessionmaker
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
 from sqlalchemy_utils import dependent_objects, get_referencing_foreign_keys
 from starlette.config import environ
 from starlette.exceptions import HTTPException
 
+from .config import config
 from .middleware import get_request_id
+from .monitoring import PoolStats, instrument_queries
+from .utils import chunked
 
 metadata = sa.MetaData()
-Session = scoped_session(sessionmaker(autoflush=False), scopefunc=get_request_id)
+
+_use_primary_ctx_var: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "use_primary", default=False
+)
+
+
+@contextlib.contextmanager
+def use_primary() -> typing.Iterator[None]:
+    """Send all queries within the block to the primary database."""
+
+    token = _use_primary_ctx_var.set(True)
+    try:
+        yield
+    finally:
+        _use_primary_ctx_var.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Chooses which replica engine a read is sent to, either ``round_robin``
+    or ``least_connections`` which uses the connections checked out of each
+    replica's pool.
+    """
+
+    strategies = ("round_robin", "least_connections")
+
+    def __init__(
+        self, replicas: typing.Sequence[Engine], strategy: str = "round_robin"
+    ) -> None:
+        if not replicas:
+            raise ValueError("at least one replica is required")
+        if strategy not in self.strategies:
+            raise ValueError(f"strategy must be one of {', '.join(self.strategies)}")
+
+        self.replicas = list(replicas)
+        self.strategy = strategy
+        self._cycle = itertools.cycle(self.replicas)
+        self._lock = threading.Lock()
+
+    def choose(self) -> Engine:
+        if self.strategy == "least_connections":
+            return min(
+                self.replicas,
+                key=lambda engine: getattr(engine.pool, "checkedout", lambda: 0)(),
+            )
+        with self._lock:
+            return next(self._cycle)
+
+
+class RoutingSession(OrmSession):
+    """
+    A session that sends reads to a replica when a router is configured.
+    Writes, locking reads, raw SQL and any read after this session has
+    flushed or executed a write go to the primary, as does everything within
+    a `use_primary()` block.
+    """
+
+    def __init__(
+        self, router: typing.Optional[ReplicaRouter] = None, **kwargs: typing.Any
+    ) -> None:
+        super().__init__(**kwargs)
+        self.router = router
+        self._used_primary = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.router is not None:
+            if self._flushing or isinstance(clause, (UpdateBase, TextClause)):
+                # keep reads consistent with any writes made in this session,
+                # including writes made within a `use_primary()` block
+                self._used_primary = True
+            elif (
+                isinstance(clause, Select)
+                and clause._for_update_arg is None
+                and not self._used_primary
+                and not _use_primary_ctx_var.get()
+            ):
+                return self.router.choose()
+
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+    def close(self) -> None:
+        super().close()
+        self._used_primary = False
+
+
+Session = scoped_session(
+    sessionmaker(class_=RoutingSession, autoflush=False), scopefunc=get_request_id
+)
+
+# executor used to run blocking database calls from async code,
+# ``None`` uses the event loop's default executor
+_executor: typing.Optional[Executor] = None
+
+
+# a lock for each request's session, held while a call uses it
+_session_locks: "weakref.WeakValueDictionary[typing.Any, asyncio.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+async def _run_in_executor(func: typing.Callable, *args, **kwargs) -> typing.Any:
+    # for calls that don't use the session, so can be run outside a request
+    loop = asyncio.get_event_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_executor, call)
+
+
+async def run_in_executor(func: typing.Callable, *args, **kwargs) -> typing.Any:
+    """
+    Run a blocking callable in the database executor.
+
+    The current context is copied into the worker thread so that
+    `get_request_id` and therefore the scoped `Session` resolve to the
+    same session as the calling request. A session can't be used by two
+    threads at once, so calls made by the same request, ie with
+    ``asyncio.gather``, are run one at a time.
+
+    Outside of a request every call would share a single session, so a
+    RuntimeError is raised instead.
+    """
+
+    request_id = get_request_id()
+    if request_id is None:
+        raise RuntimeError("async database calls must be made within a request")
+
+    lock = _session_locks.get(request_id)
+    if lock is None:
+        lock = _session_locks[request_id] = asyncio.Lock()
+    async with lock:
+        return await _run_in_executor(func, *args, **kwargs)
 
 
 class BaseQuery(Query):
@@ -24,6 +168,11 @@ class BaseQuery(Query):
             raise HTTPException(status_code=404)
         return qs
 
+    async def aget_or_404(self, ident):
+        """async version of get_or_404"""
+
+        return await run_in_executor(self.get_or_404, ident)
+
 
 @as_declarative(metadata=metadata)
 class Base:
@@ -69,6 +218,107 @@ class Base:
             session.rollback()
             raise
 
+    @classmethod
+    def bulk_save(
+        cls,
+        instances: typing.Iterable["Base"],
+        batch_size: int = 1000,
+        return_defaults: bool = False,
+    ) -> int:
+        """
+        Save many instances within a single transaction, flushing them in
+        batches using executemany. Returns the number of instances saved.
+
+        Instances are not added to the session and primary keys are only
+        populated when ``return_defaults`` is set, which is much slower.
+        """
+
+        session = Session()
+        count = 0
+
+        try:
+            for batch in chunked(instances, batch_size):
+                session.bulk_save_objects(batch, return_defaults=return_defaults)
+                count += len(batch)
+            session.commit()
+        except:
+            session.rollback()
+            raise
+
+        return count
+
+    @classmethod
+    def bulk_delete(
+        cls, instances: typing.Iterable[typing.Any], batch_size: int = 1000
+    ) -> int:
+        """
+        Delete many instances, or primary key values, within a single
+        transaction. Returns the number of rows deleted. The primary key
+        values of a model with a composite primary key are tuples.
+
+        Deletes are issued directly against the table so any instances
+        already loaded in the session are not expired.
+        """
+
+        session = Session()
+        pk = sa.inspect(cls).primary_key
+        count = 0
+
+        try:
+            for batch in chunked(instances, batch_size):
+                idents = [_identity(obj, pk) for obj in batch]
+                result = session.execute(
+                    pk[0].table.delete().where(_identity_in(pk, idents))
+                )
+                count += result.rowcount
+            session.commit()
+        except:
+            session.rollback()
+            raise
+
+        return count
+
+    @classmethod
+    def bulk_upsert(
+        cls, mappings: typing.Iterable[dict], batch_size: int = 1000
+    ) -> typing.Tuple[int, int]:
+        """
+        Insert or update many rows from dictionaries of attribute values within
+        a single transaction. Rows with a primary key that already exists are
+        updated, the rest are inserted. Returns ``(inserted, updated)``.
+        """
+
+        session = Session()
+        mapper = sa.inspect(cls)
+        pk = mapper.primary_key
+        keys = [mapper.get_property_by_column(column).key for column in pk]
+        inserted = updated = 0
+
+        try:
+            for batch in chunked(mappings, batch_size):
+                batch_idents = [tuple(m.get(key) for key in keys) for m in batch]
+                idents = [i for i in batch_idents if None not in i]
+                existing = set()
+                if idents:
+                    # a replica may not have the rows yet, so check the primary
+                    with use_primary():
+                        rows = session.query(*pk).filter(_identity_in(pk, idents))
+                        existing = {tuple(row) for row in rows}
+
+                updates = [m for m, i in zip(batch, batch_idents) if i in existing]
+                inserts = [m for m, i in zip(batch, batch_idents) if i not in existing]
+
+                session.bulk_update_mappings(cls, updates)
+                session.bulk_insert_mappings(cls, inserts)
+                inserted += len(inserts)
+                updated += len(updates)
+            session.commit()
+        except:
+            session.rollback()
+            raise
+
+        return inserted, updated
+
     def can_be_deleted(self) -> bool:
         """
         Simple helper to check if the instance has entities
@@ -95,38 +345,306 @@ class Base:
 
         sa.inspect(self).session.refresh(self)
 
+    async def asave(self) -> None:
+        """async version of save"""
+
+        await run_in_executor(self.save)
+
+    async def adelete(self) -> None:
+        """async version of delete"""
+
+        await run_in_executor(self.delete)
+
+    async def arefresh_from_db(self) -> None:
+        """async version of refresh_from_db"""
+
+        await run_in_executor(self.refresh_from_db)
+
+
+def _identity(obj: typing.Any, pk: typing.Sequence[sa.Column]) -> tuple:
+    """the primary key values of an instance, or of a value or tuple of values"""
+
+    if isinstance(obj, Base):
+        return sa.inspect(obj).identity
+    ident = tuple(obj) if isinstance(obj, (tuple, list)) else (obj,)
+    if len(ident) != len(pk):
+        raise ValueError(f"{obj!r} is not a primary key of {len(pk)} values")
+    return ident
+
+
+def _identity_in(pk: typing.Sequence[sa.Column], idents: list) -> typing.Any:
+    """a clause matching rows by the whole of their primary key"""
+
+    if len(pk) == 1:
+        return pk[0].in_([ident[0] for ident in idents])
+    return sa.tuple_(*pk).in_(idents)
+
+
+def engine_kwargs_from_config(url: "DatabaseURL") -> dict:
+    """
+    Return the ``sa.create_engine`` arguments set in the config for a
+    database, only including those its dialect supports.
+    """
+
+    url = DatabaseURL(url)
+    engine_kwargs: typing.Dict[str, typing.Any] = {
+        "echo": config.database_echo,
+        "pool_pre_ping": config.database_pool_pre_ping,
+    }
+    connect_args: typing.Dict[str, typing.Any] = {}
+    timeout = config.database_statement_timeout
+
+    # sqlite uses a connection per thread or a single connection, not a pool
+    if url.dialect != "sqlite":
+        engine_kwargs["pool_size"] = config.database_pool_size
+        engine_kwargs["max_overflow"] = config.database_max_overflow
+        engine_kwargs["pool_recycle"] = config.database_pool_recycle
+
+    if timeout is not None and url.dialect == "postgresql":
+        connect_args["options"] = f"-c statement_timeout={timeout}"
+    elif timeout is not None and url.dialect == "mysql":
+        connect_args["init_command"] = f"SET SESSION max_execution_time={timeout}"
+
+    if connect_args:
+        engine_kwargs["connect_args"] = connect_args
+    return engine_kwargs
+
 
 class Database:
     engine = None
 
-    def __init__(self, url: "DatabaseURL", engine_kwargs: dict = {}) -> None:
+    def __init__(
+        self,
+        url: "DatabaseURL",
+        engine_kwargs: dict = {},
+        replica_urls: typing.Sequence["DatabaseURL"] = (),
+        replica_strategy: str = "round_robin",
+        slow_query_threshold: typing.Optional[float] = None,
+    ) -> None:
         # configure the engine
         self.engine = sa.create_engine(str(url), **engine_kwargs)
-        Session.configure(bind=self.engine)
+        self.replica_engines = [
+            sa.create_engine(str(replica_url), **engine_kwargs)
+            for replica_url in replica_urls
+        ]
+        # instrument the pools and queries
+        self.pool_stats = PoolStats(self.engine)
+        self.replica_pool_stats = [PoolStats(e) for e in self.replica_engines]
+        for engine in [self.engine] + self.replica_engines:
+            instrument_queries(engine, slow_query_threshold=slow_query_threshold)
+        router = None
+        if self.replica_engines:
+            router = ReplicaRouter(self.replica_engines, strategy=replica_strategy)
+        Session.configure(bind=self.engine, router=router)
         # setup the model.query property
         Base.query = Session.query_property(query_cls=BaseQuery)
 
+    @classmethod
+    def from_config(cls, **kwargs: typing.Any) -> "Database":
+        """
+        Create the database from ``config.database_url`` and the other
+        database settings. Keyword arguments are passed to the constructor.
+        """
+
+        url = config.database_url
+        if url is None:
+            raise ValueError("config.database_url must be set")
+
+        kwargs.setdefault("engine_kwargs", engine_kwargs_from_config(url))
+        kwargs.setdefault(
+            "replica_urls", [DatabaseURL(u) for u in config.database_replica_urls]
+        )
+        return cls(url, **kwargs)
+
+    def health(self) -> dict:
+        """Return the connection pool statistics of the primary and replicas."""
+
+        return {
+            "primary": self.pool_stats.snapshot(),
+            "replicas": [stats.snapshot() for stats in self.replica_pool_stats],
+        }
+
     def create_all(self) -> None:
         metadata.create_all(self.engine)
 
     def drop_all(self) -> None:
         metadata.drop_all(self.engine)
 
-    def truncate_all(self, force: bool = False) -> None:
+    def truncate_all(self, force: bool = False, only_dirty: bool = True) -> None:
+        """
+        Remove all rows from every table. On PostgreSQL this is done with a
+        single ``TRUNCATE ... RESTART IDENTITY CASCADE``.
+
+        After the first call inserts, updates and deletes are tracked so that
+        later calls only empty the tables written to since, unless
+        ``only_dirty`` is ``False``. Raw SQL marks every table as written to.
+        """
+
         if not (environ.get("TESTING") == "TRUE" or force):
             raise Exception("can only truncate while testing or set to force")
 
         if not self.engine:
             raise Exception("no engine configured")
 
-        with contextlib.closing(self.engine.connect()) as conn:
-            trans = conn.begin()
-            for table in reversed(metadata.sorted_tables):
-                try:
-                    conn.execute(table.delete())
-                except:
-                    pass
-            trans.commit()
+        tables = list(reversed(metadata.sorted_tables))
+        if only_dirty and self._dirty_tables is not None and not self._all_dirty:
+            tables = [table for table in tables if table in self._dirty_tables]
+
+        if tables:
+            with contextlib.closing(self.engine.connect()) as conn:
+                trans = conn.begin()
+                if self.engine.dialect.name == "postgresql":
+                    self._truncate_postgresql(conn, tables)
+                else:
+                    for table in tables:
+                        try:
+                            conn.execute(table.delete())
+                        except:
+                            pass
+                trans.commit()
+
+        # the deletes above will have marked the tables as written to
+        self._track_dirty_tables()
+
+    def _truncate_postgresql(self, conn, tables: typing.List[sa.Table]) -> None:
+        existing = set(sa.inspect(conn).get_table_names())
+        names = [
+            conn.dialect.identifier_preparer.format_table(table)
+            for table in tables
+            if table.schema or table.name in existing
+        ]
+        if names:
+            conn.execute(
+                sa.text(f"TRUNCATE {', '.join(names)} RESTART IDENTITY CASCADE")
+            )
+
+    _dirty_tables: typing.Optional[typing.Set[sa.Table]] = None
+    _all_dirty = False
+
+    def _track_dirty_tables(self) -> None:
+        """Start, or reset, tracking the tables written to."""
+
+        if self._dirty_tables is None:
+            sa.event.listen(self.engine, "after_execute", self._after_execute)
+        self._dirty_tables = set()
+        self._all_dirty = False
+
+    def _after_execute(self, conn, clauseelement, *args) -> None:
+        if isinstance(clauseelement, UpdateBase):
+            table = getattr(clauseelement, "table", None)
+            if isinstance(table, sa.Table):
+                self._dirty_tables.add(table)  # type: ignore
+            else:
+                self._all_dirty = True
+        elif isinstance(clauseelement, (str, TextClause)):
+            self._all_dirty = True
+
+    @contextlib.contextmanager
+    def rollback_transaction(self, force: bool = False) -> typing.Iterator[None]:
+        """
+        Bind the `Session` to a connection within a transaction that is rolled
+        back at the end of the block, so nothing written within it needs to be
+        truncated. Commits and rollbacks made by the session within the block
+        are turned into savepoints.
+        """
+
+        if not (environ.get("TESTING") == "TRUE" or force):
+            raise Exception("can only rollback while testing or set to force")
+
+        if not self.engine:
+            raise Exception("no engine configured")
+
+        # end the current session before it can share the connection
+        Session.remove()
+        conn = self.engine.connect()
+
+        # pysqlite does not begin transactions itself, without which a
+        # savepoint is committed on release
+        dbapi_connection = conn.connection.connection
+        isolation_level = None
+        if self.engine.dialect.name == "sqlite":
+            isolation_level = dbapi_connection.isolation_level
+            dbapi_connection.isolation_level = None
+
+        trans = conn.begin()
+        if self.engine.dialect.name == "sqlite":
+            getattr(conn, "exec_driver_sql", conn.execute)("BEGIN")
+
+        def restart_savepoint(session, transaction):
+            if transaction.nested and not transaction._parent.nested:
+                session.begin_nested()
+
+        # replicas would not see anything written within the transaction
+        router = Session.session_factory.kw.get("router")
+        Session.configure(bind=conn, router=None)
+        sa.event.listen(OrmSession, "after_transaction_end", restart_savepoint)
+        Session().begin_nested()
+
+        try:
+            yield
+        finally:
+            Session.remove()
+            sa.event.remove(OrmSession, "after_transaction_end", restart_savepoint)
+            Session.configure(bind=self.engine, router=router)
+            trans.rollback()
+            if self.engine.dialect.name == "sqlite":
+                dbapi_connection.isolation_level = isolation_level
+            conn.close()
+
+
+class AsyncDatabase(Database):
+    """
+    A `Database` for use within async handlers. Blocking calls are run in a
+    bounded thread pool so a slow query does not stall the event loop.
+
+    The pool is also used by `Base.asave()`, `Base.adelete()`,
+    `Base.arefresh_from_db()` and `BaseQuery.aget_or_404()`.
+    """
+
+    def __init__(
+        self,
+        url: "DatabaseURL",
+        engine_kwargs: dict = {},
+        max_workers: typing.Optional[int] = None,
+        **kwargs: typing.Any,
+    ) -> None:
+        global _executor
+
+        super().__init__(url, engine_kwargs=engine_kwargs, **kwargs)
+
+        # ideally ``max_workers`` should not exceed the connections the engine
+        # pool can hand out, otherwise threads will just queue on the pool
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="starlette_core.database"
+        )
+        _executor = self.executor
+
+    async def run(self, func: typing.Callable, *args, **kwargs) -> typing.Any:
+        """run a blocking callable in the database thread pool"""
+
+        return await run_in_executor(func, *args, **kwargs)
+
+    async def acreate_all(self) -> None:
+        await _run_in_executor(self.create_all)
+
+    async def adrop_all(self) -> None:
+        await _run_in_executor(self.drop_all)
+
+    async def atruncate_all(self, force: bool = False) -> None:
+        await _run_in_executor(self.truncate_all, force=force)
+
+    def close(self) -> None:
+        """shutdown the thread pool and dispose of the engine connections"""
+
+        global _executor
+
+        if _executor is self.executor:
+            _executor = None
+        self.executor.shutdown(wait=True)
+        if self.engine:
+            self.engine.dispose()
+        for engine in self.replica_engines:
+            engine.dispose()
 
 
 class _EmptyNetloc(str):
@@ -8,3 +8,7 @@ class PageNotAnInteger(InvalidPage):
 
 class EmptyPage(InvalidPage):
     pass
+
+
+class InvalidCursor(InvalidPage):
+    pass
@@ -0,0 +1,78 @@
+import hashlib
+import typing
+
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from .cache import DEFAULT_TIMEOUT, BaseCache, LocMemCache
+
+# the default cache for rendered fragments, see `CacheExtension`
+fragment_cache = LocMemCache(max_entries=1000)
+
+
+class CacheExtension(Extension):
+    """
+    Caches the rendered output of part of a template:
+
+        {% cache "sidebar", 60, request.user.id %}
+            ...
+        {% endcache %}
+
+    The first argument is the fragment's key, followed by the number of
+    seconds to keep it for (the cache's default if omitted or ``None``) and
+    then any values the output varies by, each cached separately.
+
+    Fragments are kept in ``environment.fragment_cache``, which can be
+    replaced by any `BaseCache` such as a `RedisCache`.
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment: jinja2.Environment) -> None:
+        super().__init__(environment)
+        environment.extend(fragment_cache=fragment_cache)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        key = parser.parse_expression()
+        timeout = nodes.Const(None)
+        if parser.stream.skip_if("comma"):
+            timeout = parser.parse_expression()
+        vary = []
+        while parser.stream.skip_if("comma"):
+            vary.append(parser.parse_expression())
+
+        body = parser.parse_statements(["name:endcache"], drop_needle=True)
+        method = "_cache_async" if self.environment.is_async else "_cache"
+        call = self.call_method(method, [key, timeout, nodes.List(vary)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    @property
+    def cache(self) -> BaseCache:
+        return self.environment.fragment_cache  # type: ignore
+
+    def make_key(self, key: typing.Any, vary: list) -> str:
+        digest = hashlib.sha1(repr((key, vary)).encode()).hexdigest()
+        return f"template.fragment.{digest}"
+
+    def _cache(self, key, timeout, vary, caller) -> str:
+        cache_key = self.make_key(key, vary)
+        value = self.cache.get(cache_key)
+        if value is None:
+            value = caller()
+            self.cache.set(cache_key, str(value), self._timeout(timeout))
+        return Markup(value)
+
+    async def _cache_async(self, key, timeout, vary, caller) -> str:
+        cache_key = self.make_key(key, vary)
+        value = self.cache.get(cache_key)
+        if value is None:
+            value = await caller()
+            self.cache.set(cache_key, str(value), self._timeout(timeout))
+        return Markup(value)
+
+    def _timeout(self, timeout: typing.Optional[int]) -> typing.Any:
+        return DEFAULT_TIMEOUT if timeout is None else timeout
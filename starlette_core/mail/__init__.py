@@ -1,10 +1,19 @@
 import email.utils
+import threading
 import typing
 from email.message import EmailMessage
 
 from ..config import config
-from ..utils import import_string
+from ..utils import cached_import_string
 from .backends.base import BaseEmailBackend
+from .fanout import SendReport, SendResult, send_fanout, send_fanout_async
+
+# messages sent with the locmem backend
+outbox: typing.List[EmailMessage] = []
+
+# backends shared by every send that doesn't pass a connection
+_default_connections: typing.Dict[tuple, BaseEmailBackend] = {}
+_default_connections_lock = threading.Lock()
 
 
 def get_connection(
@@ -17,10 +26,46 @@ def get_connection(
     Both fail_silently and other keyword arguments are used in the
     constructor of the backend.
     """
-    klass = import_string(backend or config.email_backend)
+    klass = cached_import_string(backend or config.email_backend)
     return klass(fail_silently=fail_silently, **kwds)
 
 
+def get_default_connection(fail_silently: bool = False) -> BaseEmailBackend:
+    """
+    Return an instance of config.email_backend shared by the whole process,
+    a new one is created if the setting is changed.
+    """
+
+    key = (config.email_backend, fail_silently)
+    try:
+        return _default_connections[key]
+    except KeyError:
+        pass
+
+    with _default_connections_lock:
+        if key not in _default_connections:
+            _default_connections[key] = get_connection(fail_silently=fail_silently)
+        return _default_connections[key]
+
+
+def clear_default_connections() -> None:
+    """Forget the shared backends, closing any open connections."""
+
+    with _default_connections_lock:
+        for connection in _default_connections.values():
+            connection.close()
+        _default_connections.clear()
+
+
+def set_default_from(msg: EmailMessage) -> None:
+    """Set the From header to the configured default if not already set."""
+
+    if not msg.get("From"):
+        msg["From"] = email.utils.formataddr(
+            (config.email_default_from_name, config.email_default_from_address)
+        )
+
+
 def send_message(
     msg: EmailMessage,
     connection: typing.Optional[BaseEmailBackend] = None,
@@ -28,10 +73,20 @@ def send_message(
 ):
     """Send an ``email.message.EmailMessage``."""
 
-    if not msg.get("From"):
-        msg["From"] = email.utils.formataddr(
-            (config.email_default_from_name, config.email_default_from_address)
-        )
+    set_default_from(msg)
 
-    connection = connection or get_connection(fail_silently=fail_silently)
+    connection = connection or get_default_connection(fail_silently=fail_silently)
     return connection.send_messages([msg])
+
+
+async def send_message_async(
+    msg: EmailMessage,
+    connection: typing.Optional[BaseEmailBackend] = None,
+    fail_silently: bool = False,
+):
+    """Send an ``email.message.EmailMessage`` without blocking the event loop."""
+
+    set_default_from(msg)
+
+    connection = connection or get_default_connection(fail_silently=fail_silently)
+    return await connection.send_messages_async([msg])
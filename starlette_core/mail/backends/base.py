@@ -1,6 +1,8 @@
 import typing
 from email.message import EmailMessage
 
+from starlette.concurrency import run_in_threadpool
+
 
 class BaseEmailBackend:
     """
@@ -53,3 +55,15 @@ class BaseEmailBackend:
 
         msg = "subclasses of BaseEmailBackend must override send_messages() method"
         raise NotImplementedError(msg)
+
+    async def send_messages_async(
+        self, email_messages: typing.List[EmailMessage]
+    ) -> int:
+        """
+        Send one or more EmailMessage objects without blocking the event loop
+        and return the number of email messages sent.
+
+        The default implementation runs send_messages() in a thread.
+        """
+
+        return await run_in_threadpool(self.send_messages, email_messages)
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+import typing
+from email.generator import BytesGenerator
+from email.message import EmailMessage
+
+from ...config import config
+from .base import BaseEmailBackend
+
+
+class EmailBackend(BaseEmailBackend):
+    """
+    A backend that appends messages to an mbox file rather than sending them.
+
+    Messages are written straight to the file without being built in memory
+    first. Once the file reaches ``max_bytes`` it is renamed with a ``.1``
+    suffix, older files become ``.2``, ``.3`` and so on, and ``backup_count``
+    of them are kept.
+    """
+
+    def __init__(
+        self,
+        file_path: typing.Optional[str] = None,
+        max_bytes: typing.Optional[int] = None,
+        backup_count: int = 5,
+        fail_silently: bool = False,
+        **kwargs: typing.Any,
+    ) -> None:
+        super().__init__(fail_silently=fail_silently)
+        self.file_path = file_path or config.email_file_path
+        self.max_bytes = max_bytes or config.email_file_max_bytes
+        self.backup_count = backup_count
+        self.stream: typing.Optional[typing.BinaryIO] = None
+        self._lock = threading.RLock()
+
+    def open(self):
+        if self.stream is not None:
+            return False
+        self.stream = open(self.file_path, "ab")
+        return True
+
+    def close(self):
+        if self.stream is None:
+            return
+        try:
+            self.stream.close()
+        finally:
+            self.stream = None
+
+    def rotate(self) -> None:
+        self.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.file_path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.file_path}.{i + 1}")
+        if self.backup_count:
+            os.replace(self.file_path, f"{self.file_path}.1")
+        else:
+            os.remove(self.file_path)
+        self.open()
+
+    def write_message(self, message: EmailMessage) -> None:
+        assert self.stream is not None
+        if self.max_bytes and self.stream.tell() >= self.max_bytes:
+            self.rotate()
+            assert self.stream is not None
+
+        self.stream.write(b"From MAILER-DAEMON " + time.asctime().encode() + b"\n")
+        BytesGenerator(self.stream, mangle_from_=True).flatten(message)
+        self.stream.write(b"\n\n")
+
+    def send_messages(self, email_messages: typing.List[EmailMessage]) -> int:
+        """Write all messages to the file in a thread-safe way."""
+
+        if not email_messages:
+            return 0
+        msg_count = 0
+        with self._lock:
+            try:
+                stream_created = self.open()
+                for message in email_messages:
+                    self.write_message(message)
+                    msg_count += 1
+                typing.cast(typing.BinaryIO, self.stream).flush()
+                if stream_created:
+                    self.close()
+            except Exception:
+                if not self.fail_silently:
+                    raise
+        return msg_count
@@ -0,0 +1,17 @@
+import typing
+from email.message import EmailMessage
+
+from ... import mail
+from .base import BaseEmailBackend
+
+
+class EmailBackend(BaseEmailBackend):
+    """
+    A backend for testing that adds messages to ``starlette_core.mail.outbox``
+    rather than sending them. The message objects themselves are stored, they
+    are not copied or serialized.
+    """
+
+    def send_messages(self, email_messages: typing.List[EmailMessage]) -> int:
+        mail.outbox.extend(email_messages)
+        return len(email_messages)
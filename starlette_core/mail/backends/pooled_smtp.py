@@ -0,0 +1,203 @@
+import asyncio
+import queue
+import smtplib
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+from ...config import config
+from .smtp import EmailBackend as SMTPEmailBackend
+
+# pools are shared by every backend instance with the same server and credentials
+_pools: typing.Dict[tuple, "ConnectionPool"] = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    A pool of open, authenticated SMTP connections.
+
+    At most ``size`` connections are in use at once. A connection that has
+    been idle for longer than ``keepalive`` seconds is checked with a NOOP
+    before it is reused and replaced if the server has disconnected it.
+    """
+
+    def __init__(
+        self, connect: typing.Callable, size: int, keepalive: typing.Optional[int]
+    ) -> None:
+        self.connect = connect
+        self.size = size
+        self.keepalive = keepalive
+        self.executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="starlette_core.mail"
+        )
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._semaphore = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        """Return an open connection, waiting for one to be free if needed."""
+
+        self._semaphore.acquire()
+
+        try:
+            while True:
+                try:
+                    connection, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self.connect()
+
+                idle = time.monotonic() - last_used
+                if self.keepalive is None or idle < self.keepalive:
+                    return connection
+                if self.is_alive(connection):
+                    return connection
+                self.discard(connection)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def release(self, connection, reuse: bool = True) -> None:
+        """
+        Return a connection to the pool, or close it if it can't be reused.
+        ``connection`` is None when it has already been discarded.
+        """
+
+        if connection is None:
+            pass
+        elif reuse:
+            self._idle.put((connection, time.monotonic()))
+        else:
+            self.discard(connection)
+        self._semaphore.release()
+
+    def is_alive(self, connection) -> bool:
+        try:
+            return connection.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def discard(self, connection) -> None:
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def close(self) -> None:
+        """Close every idle connection."""
+
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(connection)
+
+
+class EmailBackend(SMTPEmailBackend):
+    """
+    An SMTP backend that keeps connections open between sends rather than
+    connecting, starting TLS and logging in for every message.
+
+    ``pool_size`` limits the number of connections, and therefore the number of
+    concurrent sends. ``keepalive`` is the number of seconds a connection can be
+    idle before it is checked with a NOOP.
+    """
+
+    def __init__(
+        self,
+        pool_size: typing.Optional[int] = None,
+        keepalive: typing.Optional[int] = None,
+        fail_silently: bool = False,
+        **kwargs: typing.Any
+    ) -> None:
+        super().__init__(fail_silently=fail_silently, **kwargs)
+        self.pool_size = pool_size or config.email_pool_size
+        self.keepalive = keepalive or config.email_pool_keepalive
+
+    @property
+    def pool(self) -> ConnectionPool:
+        key = (self.host, self.port, self.username, self.use_tls, self.pool_size)
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(
+                    self.connect, self.pool_size, self.keepalive
+                )
+            return _pools[key]
+
+    def open(self):
+        """Connections are opened by the pool as they are needed."""
+
+    def close(self):
+        """Connections are kept open by the pool, see close_pool()."""
+
+    def close_pool(self) -> None:
+        """Close the idle connections in this backend's pool."""
+
+        self.pool.close()
+
+    def send_messages(self, email_messages: typing.List[EmailMessage]) -> int:
+        """
+        Send one or more EmailMessage objects over a pooled connection and
+        return the number of email messages sent.
+        """
+
+        if not email_messages:
+            return 0
+
+        pool = self.pool
+        try:
+            connection = pool.acquire()
+        except OSError:
+            if not self.fail_silently:
+                raise
+            return 0
+
+        num_sent = 0
+        reuse = True
+        try:
+            for message in email_messages:
+                try:
+                    try:
+                        connection.send_message(message)
+                    except smtplib.SMTPServerDisconnected:
+                        # reconnect once, the server may have timed the connection
+                        # out. `connection` is cleared first so that the dropped
+                        # connection is never released back to the pool.
+                        pool.discard(connection)
+                        connection = None
+                        connection = self.connect()
+                        connection.send_message(message)
+                    num_sent += 1
+                except smtplib.SMTPServerDisconnected:
+                    reuse = False
+                    raise
+                except smtplib.SMTPException:
+                    # ie a refused recipient, the connection is still usable
+                    if not self.fail_silently:
+                        raise
+                except OSError:
+                    # SMTPException is an OSError so this is checked after it
+                    reuse = False
+                    raise
+        except (smtplib.SMTPException, OSError):
+            if not self.fail_silently:
+                raise
+        finally:
+            pool.release(connection, reuse=reuse)
+
+        return num_sent
+
+    async def send_messages_async(
+        self, email_messages: typing.List[EmailMessage]
+    ) -> int:
+        """
+        Send one or more EmailMessage objects without blocking the event loop,
+        using a thread per pooled connection.
+        """
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.pool.executor, self.send_messages, email_messages
+        )
@@ -0,0 +1,378 @@
+import email
+import email.policy
+import logging
+import queue
+import smtplib
+import sqlite3
+import threading
+import time
+import typing
+from email.message import EmailMessage
+
+from ...config import config
+from ...monitoring import DEFAULT_LATENCY_BUCKETS, Histogram
+from ...utils import import_string
+from .base import BaseEmailBackend
+
+logger = logging.getLogger("starlette_core.mail")
+
+
+def is_permanent_error(exc: Exception) -> bool:
+    """Return True if sending the message again would fail the same way."""
+
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 500 <= exc.smtp_code < 600
+    return False
+
+
+def close_quietly(backend: BaseEmailBackend) -> None:
+    try:
+        backend.close()
+    except Exception:
+        pass
+
+
+class MemoryQueue:
+    """A bounded in-process queue of messages, lost if the process exits."""
+
+    def __init__(self, maxsize: int) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, message: EmailMessage) -> None:
+        self._queue.put_nowait(message)
+
+    def get_batch(self, size: int, timeout: float) -> typing.List[tuple]:
+        """Return up to ``size`` ``(id, message)`` pairs, waiting for the first."""
+
+        try:
+            batch = [(None, self._queue.get(timeout=timeout))]
+        except queue.Empty:
+            return []
+
+        while len(batch) < size:
+            try:
+                batch.append((None, self._queue.get_nowait()))
+            except queue.Empty:
+                break
+        return batch
+
+    def ack(self, ids: typing.List[typing.Any]) -> None:
+        """Messages are removed from memory as soon as they are taken."""
+
+    def requeue(self, batch: typing.List[tuple]) -> None:
+        """Put messages taken but not sent back at the front of the queue."""
+
+        with self._queue.mutex:
+            self._queue.queue.extendleft(message for _, message in reversed(batch))
+            self._queue.not_empty.notify()
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+
+class SQLiteQueue:
+    """
+    A bounded queue of messages stored in a SQLite database, so messages not
+    yet sent survive a restart. Messages are only removed once acknowledged.
+    """
+
+    def __init__(self, path: str, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS email_queue "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, data BLOB NOT NULL)"
+        )
+        self._connection.commit()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        # the id of the last message taken but not yet acknowledged
+        self._taken = 0
+
+    def put(self, message: EmailMessage) -> None:
+        with self._not_empty:
+            if self.maxsize and self._count() >= self.maxsize:
+                raise queue.Full
+            with self._connection:
+                self._connection.execute(
+                    "INSERT INTO email_queue (data) VALUES (?)", (message.as_bytes(),)
+                )
+            self._not_empty.notify()
+
+    def get_batch(self, size: int, timeout: float) -> typing.List[tuple]:
+        with self._not_empty:
+            rows = self._select(size)
+            if not rows:
+                self._not_empty.wait(timeout)
+                rows = self._select(size)
+
+        if rows:
+            self._taken = rows[-1][0]
+        return [
+            (row_id, email.message_from_bytes(data, policy=email.policy.default))
+            for row_id, data in rows
+        ]
+
+    def ack(self, ids: typing.List[typing.Any]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM email_queue WHERE id = ?", [(i,) for i in ids]
+            )
+
+    def requeue(self, batch: typing.List[tuple]) -> None:
+        """Take messages that were not sent again, they are still stored."""
+
+        with self._lock:
+            self._taken = min(self._taken, min(row_id for row_id, _ in batch) - 1)
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def _count(self) -> int:
+        (count,) = self._connection.execute(
+            "SELECT count(*) FROM email_queue"
+        ).fetchone()
+        return count
+
+    def _select(self, size: int) -> list:
+        return self._connection.execute(
+            "SELECT id, data FROM email_queue WHERE id > ? ORDER BY id LIMIT ?",
+            (self._taken, size),
+        ).fetchall()
+
+
+class MailQueue:
+    """
+    Sends queued messages from a background thread. Messages are taken in
+    batches of up to ``batch_size`` and sent one at a time over a single
+    connection of the backend returned by ``backend_factory``. Messages that
+    failed to send are retried with an exponential backoff, up to
+    ``max_retries`` times, unless the server rejected them permanently.
+    Messages still waiting to be retried when the queue is stopped are put
+    back on the store rather than dropped.
+    """
+
+    backoff = 1.0
+    max_backoff = 60.0
+
+    def __init__(
+        self,
+        backend_factory: typing.Callable[[], BaseEmailBackend],
+        store: typing.Union[MemoryQueue, SQLiteQueue],
+        batch_size: int = 50,
+        max_retries: int = 5,
+    ) -> None:
+        self.backend_factory = backend_factory
+        self.store = store
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.send_latency = Histogram(DEFAULT_LATENCY_BUCKETS)
+        # messages left in a durable store by a previous process are pending too
+        self._pending = store.depth()
+        self._idle = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: typing.Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def put(self, message: EmailMessage) -> None:
+        """Add a message to the queue, raises ``queue.Full`` if it is full."""
+
+        self.start()
+        # counted first so the worker can't finish the message before it is
+        with self._idle:
+            self._pending += 1
+        try:
+            self.store.put(message)
+        except queue.Full:
+            with self._idle:
+                self._pending -= 1
+            raise
+
+    def start(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self.run, name="starlette_core.mail.queue", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, timeout: typing.Optional[float] = None) -> None:
+        """
+        Stop the background thread once the current send is done, without
+        waiting to retry messages that failed.
+        """
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def flush(self, timeout: typing.Optional[float] = None) -> bool:
+        """
+        Wait until every message put on the queue has been sent or has failed.
+        Returns False if the timeout was reached first.
+        """
+
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            batch = self.store.get_batch(self.batch_size, timeout=0.5)
+            if not batch:
+                continue
+            messages = [message for _, message in batch]
+            unsent = {id(message) for message in self.send_batch(messages)}
+            done = [item for item in batch if id(item[1]) not in unsent]
+            if unsent:
+                # stopped while waiting to retry, keep these for the next start
+                self.store.requeue([item for item in batch if id(item[1]) in unsent])
+            self.store.ack([message_id for message_id, _ in done])
+            with self._idle:
+                self._pending -= len(done)
+                self._idle.notify_all()
+
+    def send_batch(self, messages: typing.List[EmailMessage]) -> list:
+        """
+        Send the messages, retrying those that failed. Returns the messages
+        not sent because the queue was stopped before they could be retried.
+        """
+
+        for attempt in range(self.max_retries + 1):
+            messages = self.send_each(messages)
+            if not messages:
+                return []
+            if attempt < self.max_retries:
+                backoff = min(self.backoff * 2**attempt, self.max_backoff)
+                if self._stop.wait(backoff):
+                    return messages
+                self.retries += 1
+
+        logger.error("failed to send %d queued emails", len(messages))
+        self.failed += len(messages)
+        return []
+
+    def send_each(self, messages: typing.List[EmailMessage]) -> list:
+        """
+        Send the messages one at a time over a connection and return those
+        that should be retried.
+        """
+
+        backend = None
+        try:
+            backend = self.backend_factory()
+            backend.open()
+        except Exception:
+            logger.warning("failed to connect to send queued emails", exc_info=True)
+            if backend is not None:
+                close_quietly(backend)
+            return messages
+
+        retry: typing.List[EmailMessage] = []
+        try:
+            for index, message in enumerate(messages):
+                start = time.perf_counter()
+                try:
+                    sent = backend.send_messages([message])
+                except smtplib.SMTPServerDisconnected:
+                    # the connection is gone, retry the rest later
+                    retry.extend(messages[index:])
+                    break
+                except smtplib.SMTPException as exc:
+                    if is_permanent_error(exc):
+                        logger.error("queued email was rejected", exc_info=True)
+                        self.failed += 1
+                    else:
+                        retry.append(message)
+                    continue
+                except OSError:
+                    # SMTPException is an OSError so this is checked after it
+                    retry.extend(messages[index:])
+                    break
+                except Exception:
+                    retry.append(message)
+                    continue
+
+                self.send_latency.observe(time.perf_counter() - start)
+                if sent:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+        finally:
+            close_quietly(backend)
+
+        return retry
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.store.depth(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "send_latency": self.send_latency.snapshot(),
+        }
+
+
+_queue: typing.Optional[MailQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> MailQueue:
+    """Return the process wide queue, created from the config on first use."""
+
+    global _queue
+
+    with _queue_lock:
+        if _queue is None:
+            store: typing.Union[MemoryQueue, SQLiteQueue]
+            if config.email_queue_path:
+                store = SQLiteQueue(config.email_queue_path, config.email_queue_size)
+            else:
+                store = MemoryQueue(config.email_queue_size)
+
+            backend_class = import_string(config.email_queue_backend)
+            _queue = MailQueue(
+                backend_factory=backend_class,
+                store=store,
+                batch_size=config.email_queue_batch_size,
+                max_retries=config.email_queue_max_retries,
+            )
+            if store.depth():
+                _queue.start()
+        return _queue
+
+
+class EmailBackend(BaseEmailBackend):
+    """
+    A backend that queues messages to be sent in the background by the
+    ``EMAIL_QUEUE_BACKEND``, so sending doesn't add to the time a request takes.
+    """
+
+    def __init__(
+        self,
+        fail_silently: bool = False,
+        queue: typing.Optional[MailQueue] = None,
+        **kwargs: typing.Any
+    ) -> None:
+        super().__init__(fail_silently=fail_silently)
+        self.queue = queue or get_queue()
+
+    def send_messages(self, email_messages: typing.List[EmailMessage]) -> int:
+        """Queue the messages and return the number of messages queued."""
+
+        num_queued = 0
+        for message in email_messages:
+            try:
+                self.queue.put(message)
+            except queue.Full:
+                if not self.fail_silently:
+                    raise
+                break
+            num_queued += 1
+        return num_queued
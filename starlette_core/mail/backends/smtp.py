@@ -24,15 +24,40 @@ class EmailBackend(BaseEmailBackend):
         **kwargs: typing.Any
     ) -> None:
         super().__init__(fail_silently=fail_silently)
-        self.host = host or config.email_host
-        self.port = port or config.email_port
-        self.username = username or config.email_username
-        self.password = password or config.email_password
-        self.use_tls = use_tls or config.email_use_tls
-        self.timeout = timeout or config.email_timeout
+        # settings not given are read from the config when used
+        self._host = host
+        self._port = port
+        self._username = username
+        self._password = password
+        self._use_tls = use_tls
+        self._timeout = timeout
         self.connection = None
         self._lock = threading.RLock()
 
+    @property
+    def host(self):
+        return self._host or config.email_host
+
+    @property
+    def port(self):
+        return self._port or config.email_port
+
+    @property
+    def username(self):
+        return self._username or config.email_username
+
+    @property
+    def password(self):
+        return self._password or config.email_password
+
+    @property
+    def use_tls(self):
+        return self._use_tls or config.email_use_tls
+
+    @property
+    def timeout(self):
+        return self._timeout or config.email_timeout
+
     @property
     def connection_class(self):
         return smtplib.SMTP
@@ -48,25 +73,29 @@ class EmailBackend(BaseEmailBackend):
             # Nothing to do if the connection is already open.
             return False
 
+        try:
+            self.connection = self.connect()
+            return True
+        except OSError:
+            if not self.fail_silently:
+                raise
+
+    def connect(self):
+        """Return a new connection, using TLS and logged in as configured."""
+
         connection_params = {}
         if self.timeout is not None:
             connection_params["timeout"] = self.timeout
 
-        try:
-            self.connection = self.connection_class(
-                self.host, self.port, **connection_params
-            )
+        connection = self.connection_class(self.host, self.port, **connection_params)
 
-            if self.use_tls:
-                self.connection.starttls()
+        if self.use_tls:
+            connection.starttls()
 
-            if self.username and self.password:
-                self.connection.login(self.username, str(self.password))
+        if self.username and self.password:
+            connection.login(self.username, str(self.password))
 
-            return True
-        except OSError:
-            if not self.fail_silently:
-                raise
+        return connection
 
     def close(self):
         """Close the connection to the email server."""
@@ -75,53 +104,68 @@ class EmailBackend(BaseEmailBackend):
             return
 
         try:
-            try:
-                self.connection.quit()
-            except smtplib.SMTPServerDisconnected:
-                # This happens when calling quit() on a TLS connection
-                # sometimes, or when the connection was already disconnected
-                # by the server.
-                self.connection.close()
-            except smtplib.SMTPException:
-                if self.fail_silently:
-                    return
-                raise
+            self.quit(self.connection)
         finally:
             self.connection = None
 
+    def quit(self, connection) -> None:
+        try:
+            connection.quit()
+        except smtplib.SMTPServerDisconnected:
+            # This happens when calling quit() on a TLS connection
+            # sometimes, or when the connection was already disconnected
+            # by the server.
+            connection.close()
+        except smtplib.SMTPException:
+            if not self.fail_silently:
+                raise
+
     def send_messages(self, email_messages: typing.List[EmailMessage]) -> int:
         """
         Send one or more EmailMessage objects and return the number of email
         messages sent.
+
+        The connection opened with open() is used if there is one, otherwise
+        a connection is made just for these messages. As nothing is shared in
+        that case, a backend can be used to send from many threads at once.
         """
 
         if not email_messages:
             return 0
 
         with self._lock:
-            new_conn_created = self.open()
-            if not self.connection or new_conn_created is None:
-                # We failed silently on open(). Trying to send would be pointless.
-                return 0
-            num_sent = 0
-            for message in email_messages:
-                sent = self._send(message)
-                if sent:
-                    num_sent += 1
-            if new_conn_created:
-                self.close()
+            if self.connection:
+                return self._send_all(self.connection, email_messages)
+
+        try:
+            connection = self.connect()
+        except OSError:
+            if not self.fail_silently:
+                raise
+            return 0
+
+        try:
+            return self._send_all(connection, email_messages)
+        finally:
+            self.quit(connection)
 
+    def _send_all(self, connection, email_messages: typing.List[EmailMessage]) -> int:
+        num_sent = 0
+        for message in email_messages:
+            if self._send(message, connection):
+                num_sent += 1
         return num_sent
 
-    def _send(self, email_message: EmailMessage):
+    def _send(self, email_message: EmailMessage, connection=None):
         """A helper method that does the actual sending."""
 
-        if not self.connection:
+        connection = connection or self.connection
+        if not connection:
             # We failed silently on open(). Trying to send would be pointless.
             return False
 
         try:
-            self.connection.send_message(email_message)
+            connection.send_message(email_message)
         except smtplib.SMTPException:
             if not self.fail_silently:
                 raise
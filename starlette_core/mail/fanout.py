@@ -0,0 +1,144 @@
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+from starlette.concurrency import run_in_threadpool
+
+from .backends.base import BaseEmailBackend
+
+
+class SendResult(typing.NamedTuple):
+    message: EmailMessage
+    sent: bool
+    error: typing.Optional[Exception] = None
+
+
+class SendReport:
+    """The result of sending each message, in the order they were given."""
+
+    def __init__(self, results: typing.List[SendResult]) -> None:
+        self.results = results
+
+    @property
+    def num_sent(self) -> int:
+        return sum(1 for result in self.results if result.sent)
+
+    @property
+    def failures(self) -> typing.List[SendResult]:
+        return [result for result in self.results if not result.sent]
+
+    def __iter__(self) -> typing.Iterator[SendResult]:
+        return iter(self.results)
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+
+class RateLimiter:
+    """Spaces calls to ``wait`` so at most ``rate`` happen each second."""
+
+    def __init__(self, rate: typing.Optional[float]) -> None:
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def send_fanout(
+    messages: typing.Sequence[EmailMessage],
+    connection_factory: typing.Optional[typing.Callable[[], BaseEmailBackend]] = None,
+    workers: int = 4,
+    rate_limit: typing.Optional[float] = None,
+    max_messages_per_connection: typing.Optional[int] = None,
+) -> SendReport:
+    """
+    Send a large number of messages over ``workers`` connections at once.
+
+    Messages are shared between the workers, each with its own connection from
+    ``connection_factory`` (the configured backend by default). ``rate_limit``
+    is the maximum number of messages sent per second across every worker, and
+    a worker reconnects after ``max_messages_per_connection`` messages.
+
+    A message that fails doesn't stop the others being sent, the returned
+    report has the result of each one.
+    """
+
+    from . import get_connection, set_default_from
+
+    if connection_factory is None:
+        connection_factory = get_connection
+
+    for message in messages:
+        set_default_from(message)
+
+    results: typing.List[typing.Optional[SendResult]] = [None] * len(messages)
+    limiter = RateLimiter(rate_limit)
+
+    def send_shard(indexes: typing.Sequence[int]) -> None:
+        connection = None
+        sent_on_connection = 0
+        try:
+            for index in indexes:
+                message = messages[index]
+                if connection is not None and (
+                    sent_on_connection == max_messages_per_connection
+                ):
+                    connection.close()
+                    connection = None
+
+                limiter.wait()
+                try:
+                    if connection is None:
+                        connection = connection_factory()
+                        sent_on_connection = 0
+                        connection.open()
+                    sent_on_connection += 1
+                    sent = connection.send_messages([message]) == 1
+                except Exception as exc:
+                    results[index] = SendResult(message, False, exc)
+                    # the connection may be unusable, start afresh
+                    if connection is not None:
+                        close_quietly(connection)
+                    connection = None
+                else:
+                    results[index] = SendResult(message, sent)
+        finally:
+            if connection is not None:
+                close_quietly(connection)
+
+    workers = max(1, min(workers, len(messages)))
+    shards = [range(i, len(messages), workers) for i in range(workers)]
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="starlette_core.mail.fanout"
+    ) as executor:
+        for future in [executor.submit(send_shard, shard) for shard in shards]:
+            future.result()
+
+    return SendReport(typing.cast(typing.List[SendResult], results))
+
+
+async def send_fanout_async(
+    messages: typing.Sequence[EmailMessage], **kwargs: typing.Any
+) -> SendReport:
+    """`send_fanout` without blocking the event loop."""
+
+    return await run_in_threadpool(send_fanout, messages, **kwargs)
+
+
+def close_quietly(connection: BaseEmailBackend) -> None:
+    try:
+        connection.close()
+    except Exception:
+        pass
@@ -0,0 +1,190 @@
+import threading
+import typing
+from email.message import EmailMessage
+
+try:
+    import jinja2
+    from jinja2 import meta, nodes
+except ImportError:  # pragma: nocover
+    jinja2 = None  # type: ignore
+
+
+class CompiledEmail:
+    """
+    A loaded email template and the parts of it that are the same for every
+    message, rendered once. ``templates`` maps each block to the template it
+    is rendered from.
+
+    If ``render_root`` is set the whole template is run before its blocks are
+    rendered, so that the blocks of the templates it extends are found and the
+    names it imports or sets outside of its blocks are defined.
+    """
+
+    def __init__(
+        self,
+        templates: typing.Dict[str, "jinja2.Template"],
+        static_blocks: dict,
+        render_root: bool = False,
+    ) -> None:
+        self.templates = templates
+        self.static_blocks = static_blocks
+        self.render_root = render_root
+
+    def render_blocks(self, context: dict) -> typing.Dict[str, typing.Optional[str]]:
+        """Render each block, None for the blocks the template doesn't define."""
+
+        rendered = dict(self.static_blocks)
+        # blocks rendered from the same template share a context
+        contexts: dict = {}
+        for name, template in self.templates.items():
+            if name in rendered:
+                continue
+            if template not in contexts:
+                contexts[template] = self.new_context(template, context)
+            template_context = contexts[template]
+            blocks = template_context.blocks.get(name)
+            rendered[name] = "".join(blocks[0](template_context)) if blocks else None
+        return rendered
+
+    def new_context(
+        self, template: "jinja2.Template", context: dict
+    ) -> "jinja2.runtime.Context":
+        template_context = template.new_context(context)
+        if self.render_root:
+            # only the side effects are needed, not the output
+            for _ in template.root_render_func(template_context):
+                pass
+        return template_context
+
+
+class EmailRenderer:
+    """
+    Renders emails from Jinja templates using the environment of the project's
+    `Jinja2Templates`.
+
+    An email template defines a ``subject`` block and ``text`` and/or ``html``
+    blocks for the plain text and HTML parts:
+
+        {% block subject %}Welcome {{ name }}{% endblock %}
+        {% block text %}Hi {{ name }}, ...{% endblock %}
+        {% block html %}<p>Hi {{ name }}, ...</p>{% endblock %}
+
+    The subject and text aren't HTML, so they are rendered without
+    autoescaping. Templates may extend a layout that defines some of the
+    blocks. Templates are loaded and compiled once and blocks that don't use
+    any variables are only rendered once. Emails are rendered synchronously,
+    so the templates must not have been created with ``enable_async``.
+    """
+
+    blocks = ("subject", "text", "html")
+
+    def __init__(self, templates: typing.Any) -> None:
+        assert jinja2 is not None, "jinja2 must be installed to use EmailRenderer"
+        if templates.env.is_async:
+            raise ValueError("EmailRenderer can't use an enable_async environment")
+        self.env: "jinja2.Environment" = templates.env
+        # with its own cache, a shared one would return the autoescaped templates
+        self.plain_env = self.env.overlay(autoescape=False, cache_size=400)
+        self._compiled: typing.Dict[str, CompiledEmail] = {}
+        self._lock = threading.Lock()
+
+    def get_template(self, template_name: str) -> CompiledEmail:
+        try:
+            return self._compiled[template_name]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if template_name not in self._compiled:
+                self._compiled[template_name] = self.compile(template_name)
+            return self._compiled[template_name]
+
+    def compile(self, template_name: str) -> CompiledEmail:
+        plain_template = self.plain_env.get_template(template_name)
+        templates = {
+            "subject": plain_template,
+            "text": plain_template,
+            "html": self.env.get_template(template_name),
+        }
+        assert self.env.loader is not None
+        source, _, _ = self.env.loader.get_source(self.env, template_name)
+        ast = self.env.parse(source)
+
+        # anything outside of the blocks, ie an extends or an import
+        render_root = any(
+            not isinstance(node, (nodes.Block, nodes.Output)) for node in ast.body
+        )
+
+        static_blocks = {}
+        # these can use variables that find_undeclared_variables doesn't find
+        dynamic = (nodes.Include, nodes.Import, nodes.FromImport, nodes.Call)
+        # a block in a template that extends another may use super()
+        if ast.find(nodes.Extends) is None:
+            for block in ast.find_all(nodes.Block):
+                if block.name not in self.blocks:
+                    continue
+                body = nodes.Template(block.body)
+                body.set_environment(self.env)
+                if any(body.find(node) for node in dynamic):
+                    continue
+                if not meta.find_undeclared_variables(body):
+                    template = templates[block.name]
+                    static_blocks[block.name] = "".join(
+                        template.blocks[block.name](template.new_context({}))
+                    )
+
+        return CompiledEmail(templates, static_blocks, render_root)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._compiled.clear()
+
+    def render_message(
+        self,
+        template_name: str,
+        context: typing.Optional[dict] = None,
+        to: typing.Optional[str] = None,
+    ) -> EmailMessage:
+        """Render an ``email.message.EmailMessage`` from the template."""
+
+        return self._build(self.get_template(template_name), context or {}, to)
+
+    def render_messages(
+        self,
+        template_name: str,
+        recipients: typing.Iterable[typing.Tuple[str, dict]],
+        context: typing.Optional[dict] = None,
+    ) -> typing.List[EmailMessage]:
+        """
+        Render a message for each ``(to, context)`` recipient. ``context`` is
+        shared by every message, with the recipient's context added to it.
+        """
+
+        compiled = self.get_template(template_name)
+        shared = context or {}
+        return [
+            self._build(compiled, {**shared, **recipient_context}, to)
+            for to, recipient_context in recipients
+        ]
+
+    def _build(
+        self, compiled: CompiledEmail, context: dict, to: typing.Optional[str]
+    ) -> EmailMessage:
+        blocks = compiled.render_blocks(context)
+        subject = blocks["subject"] or ""
+        text = blocks["text"]
+        html = blocks["html"]
+
+        msg = EmailMessage()
+        msg["Subject"] = " ".join(subject.split())
+        if to is not None:
+            msg["To"] = to
+
+        if text is not None:
+            msg.set_content(text)
+            if html is not None:
+                msg.add_alternative(html, subtype="html")
+        elif html is not None:
+            msg.set_content(html, subtype="html")
+
+        return msg
@@ -1,13 +1,211 @@
+import json
+import secrets
 import typing
 
 from starlette.requests import Request
 
+from .cache import BaseCache, LocMemCache
+from .config import config
+from .utils import cached_import_string
+
+# stored as their index to keep the session small
+CATEGORIES = ("default", "debug", "info", "success", "warning", "error")
+
+
+class Message:
+    """A message and its category, ``message.category`` in templates."""
+
+    __slots__ = ("message", "category")
+
+    def __init__(self, message: typing.Any, category: str = "default") -> None:
+        self.message = message
+        self.category = category
+
+    def __getitem__(self, key: str) -> typing.Any:
+        # messages used to be dicts
+        return getattr(self, key)
+
+    def __eq__(self, other: typing.Any) -> bool:
+        return (
+            isinstance(other, Message)
+            and self.message == other.message
+            and self.category == other.category
+        )
+
+    def __repr__(self) -> str:
+        return f"Message({self.message!r}, {self.category!r})"
+
+
+def encode(message: typing.Any, category: str) -> list:
+    if category == "default":
+        return [message]
+    if category in CATEGORIES:
+        return [message, CATEGORIES.index(category)]
+    return [message, category]
+
+
+def decode(item: typing.Any) -> Message:
+    if isinstance(item, dict):
+        return Message(item["message"], item["category"])
+    if len(item) == 1:
+        return Message(item[0])
+    category = item[1]
+    return Message(
+        item[0], CATEGORIES[category] if isinstance(category, int) else category
+    )
+
+
+class BaseStorage:
+    """
+    Base class for where messages are kept between requests.
+    Subclasses must overwrite load(), save() and pop_data().
+
+    Only the newest ``max_messages`` are kept, and older messages are
+    dropped until the encoded messages are at most ``max_size`` bytes.
+    """
+
+    max_messages = 10
+    max_size = 2048
+
+    def load(self, request: Request) -> list:
+        raise NotImplementedError("subclasses of BaseStorage must override load()")
+
+    def save(self, request: Request, data: list) -> None:
+        raise NotImplementedError("subclasses of BaseStorage must override save()")
+
+    def pop_data(self, request: Request) -> list:
+        raise NotImplementedError("subclasses of BaseStorage must override pop_data()")
+
+    def add(self, request: Request, message: typing.Any, category: str) -> None:
+        data = self.load(request)
+        data.append(encode(message, category))
+        self.save(request, self.evict(data))
+
+    def pop(self, request: Request) -> typing.List[Message]:
+        return [decode(item) for item in self.pop_data(request)]
+
+    def evict(self, data: list) -> list:
+        data = data[-self.max_messages :]
+        while len(data) > 1 and self.size(data) > self.max_size:
+            data = data[1:]
+        return data
+
+    def size(self, data: list) -> int:
+        return len(json.dumps(data, default=str, separators=(",", ":")))
+
+
+class SessionStorage(BaseStorage):
+    """Keeps messages in the session."""
+
+    session_key = "_messages"
+
+    def load(self, request: Request) -> list:
+        return list(request.session.get(self.session_key, []))
+
+    def save(self, request: Request, data: list) -> None:
+        request.session[self.session_key] = data
+
+    def pop_data(self, request: Request) -> list:
+        # checked first so the session isn't touched when there is nothing
+        if self.session_key not in request.session:
+            return []
+        return request.session.pop(self.session_key) or []
+
+
+class CacheStorage(BaseStorage):
+    """
+    Keeps messages in a cache with only a short key in the session, so the
+    size of a cookie based session doesn't grow. The default cache is only
+    shared by the process, use a `RedisCache` when running more than one.
+    """
+
+    session_key = "_messages_key"
+    cache: BaseCache = LocMemCache(max_entries=10000, default_timeout=86400)
+
+    def load(self, request: Request) -> list:
+        key = request.session.get(self.session_key)
+        if key is None:
+            return []
+        return list(self.cache.get(f"messages.{key}") or [])
+
+    def save(self, request: Request, data: list) -> None:
+        key = request.session.get(self.session_key)
+        if key is None:
+            key = request.session[self.session_key] = secrets.token_urlsafe(12)
+        self.cache.set(f"messages.{key}", data)
+
+    def pop_data(self, request: Request) -> list:
+        if self.session_key not in request.session:
+            return []
+        key = request.session.pop(self.session_key)
+        data = self.cache.get(f"messages.{key}")
+        self.cache.delete(f"messages.{key}")
+        return data or []
+
+
+_storages: typing.Dict[str, BaseStorage] = {}
+
+
+def get_storage() -> BaseStorage:
+    """Return an instance of ``config.messages_storage``."""
+
+    path = config.messages_storage
+    if path not in _storages:
+        _storages[path] = cached_import_string(path)()
+    return _storages[path]
+
 
 def message(request: Request, message: typing.Any, category: str = "default") -> None:
-    if "_messages" not in request.session:
-        request.session["_messages"] = []
-    request.session["_messages"].append({"message": message, "category": category})
+    get_storage().add(request, message, category)
+
+
+class LazyMessages:
+    """
+    The messages for a request, only read from the storage, and so removed,
+    when iterated, counted or truth tested. Once read they are kept for the
+    rest of the request so every `get_messages` call has the same messages.
+    """
+
+    scope_key = "starlette_core.messages"
+
+    def __init__(self, request: Request) -> None:
+        self.request = request
+        self._messages: typing.Optional[typing.List[Message]] = None
+
+    @property
+    def messages(self) -> typing.List[Message]:
+        if self._messages is None:
+            scope = getattr(self.request, "scope", None)
+            if scope is None:
+                self._messages = get_storage().pop(self.request)
+            else:
+                if self.scope_key not in scope:
+                    scope[self.scope_key] = get_storage().pop(self.request)
+                self._messages = scope[self.scope_key]
+        return self._messages
+
+    def __iter__(self) -> typing.Iterator[Message]:
+        return iter(self.messages)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __bool__(self) -> bool:
+        return bool(self.messages)
+
+    def __getitem__(self, index: int) -> Message:
+        return self.messages[index]
+
+    def __eq__(self, other: typing.Any) -> bool:
+        if not isinstance(other, (list, tuple, LazyMessages)):
+            return NotImplemented
+        return self.messages == list(other)
+
+    def __repr__(self) -> str:
+        if self._messages is None:
+            return "LazyMessages(<not read>)"
+        return f"LazyMessages({self._messages!r})"
 
 
-def get_messages(request: Request):
-    return request.session.pop("_messages") if "_messages" in request.session else []
+def get_messages(request: Request) -> LazyMessages:
+    return LazyMessages(request)
@@ -1,19 +1,33 @@
+import itertools
+import typing
 from contextvars import ContextVar
-from uuid import uuid4
 
-from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-_request_id_ctx_var: ContextVar[str] = ContextVar(
+from .monitoring import NPlusOneDetector, QueryStats
+
+_request_id_ctx_var: ContextVar[int] = ContextVar(
     "request_id", default=None  # type: ignore
 )
 
+_query_stats_ctx_var: ContextVar[QueryStats] = ContextVar(
+    "query_stats", default=None  # type: ignore
+)
+
+# request ids only need to be unique within the process
+_request_ids = itertools.count(1)
+
+# sessions that were removed with uncommitted changes or after an error
+_leaked_sessions = 0
+
 
 _request_ctx_var: ContextVar[Scope] = ContextVar(
     "request", default=None  # type: ignore
 )
 
 
-def get_request_id() -> str:
+def get_request_id() -> int:
     return _request_id_ctx_var.get()
 
 
@@ -21,6 +35,21 @@ def get_request() -> Scope:
     return _request_ctx_var.get()
 
 
+def get_query_stats() -> QueryStats:
+    """Return the queries executed during the current request."""
+
+    return _query_stats_ctx_var.get()
+
+
+def get_leaked_session_count() -> int:
+    """
+    Return the number of sessions the `DatabaseMiddleware` has had to clean up
+    after an error or with uncommitted changes.
+    """
+
+    return _leaked_sessions
+
+
 class CurrentRequestMiddleware:
     """
     Sets the _request_ctx_var to the request.
@@ -40,41 +69,77 @@ class CurrentRequestMiddleware:
 
         local_scope = _request_ctx_var.set(scope)
 
-        response = await self.app(scope, receive, send)
-
-        _request_ctx_var.reset(local_scope)
-
-        return response
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_ctx_var.reset(local_scope)
 
 
 class DatabaseMiddleware:
     """
-    Sets the _request_id_ctx_var to a new uuid. This inturn is used
+    Sets the _request_id_ctx_var to a new request id. This inturn is used
     by the `starlette_core.database.Session` object to isolate the
-    session between requests.
+    session between requests. The session is only created when first used
+    and is always removed once the request has finished.
+
+    Optionally a `starlette_core.monitoring.NPlusOneDetector` can be provided
+    to flag repeated queries.
 
     Usage:
         from starlette_core.middleware import get_request_id
         get_request_id()
     """
 
-    def __init__(self, app: ASGIApp) -> None:
+    def __init__(
+        self, app: ASGIApp, detector: typing.Optional[NPlusOneDetector] = None
+    ) -> None:
         self.app = app
+        self.detector = detector
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         if scope["type"] not in ("http", "websocket"):
             await self.app(scope, receive, send)
             return
 
-        request_id = _request_id_ctx_var.set(str(uuid4()))
+        stats = QueryStats(request_id=next(_request_ids), detector=self.detector)
+        request_id = _request_id_ctx_var.set(stats.request_id)
+        query_stats = _query_stats_ctx_var.set(stats)
+
+        if self.detector is not None and self.detector.action == "header":
+            send = self.send_repeated_queries_header(send, stats)
 
-        response = await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        except BaseException:
+            self.remove_session(errored=True)
+            raise
+        else:
+            self.remove_session(errored=False)
+        finally:
+            _query_stats_ctx_var.reset(query_stats)
+            _request_id_ctx_var.reset(request_id)
+
+    def send_repeated_queries_header(self, send: Send, stats: QueryStats) -> Send:
+        header_name = NPlusOneDetector.header_name
+
+        async def wrapped_send(message: Message) -> None:
+            if message["type"] == "http.response.start" and stats.repeated:
+                headers = MutableHeaders(scope=message)
+                headers.append(header_name, str(len(stats.repeated)))
+            await send(message)
+
+        return wrapped_send
+
+    def remove_session(self, errored: bool) -> None:
+        global _leaked_sessions
 
         from .database import Session
 
-        if Session.registry.has():
-            Session.remove()
+        if not Session.registry.has():
+            return
 
-        _request_id_ctx_var.reset(request_id)
+        session = Session()
+        if errored or session.new or session.dirty or session.deleted:
+            _leaked_sessions += 1
 
-        return response
+        Session.remove()
@@ -0,0 +1,284 @@
+import bisect
+import collections
+import contextlib
+import functools
+import logging
+import re
+import threading
+import time
+import typing
+
+logger = logging.getLogger("starlette_core.database")
+
+# upper bounds in seconds
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+DEFAULT_AGE_BUCKETS = (60, 300, 900, 1800, 3600, 7200)
+
+_placeholders = re.compile(r"%\(\w+\)s|%s|\?|(?<!:):\w+|\$\d+")
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_placeholder_lists = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Return the shape of a statement with parameters and literals replaced by
+    ``?``, so the same query with different values has the same fingerprint.
+    """
+
+    statement = _placeholders.sub("?", statement)
+    statement = _literals.sub("?", statement)
+    statement = _placeholder_lists.sub("(?)", statement)
+    return " ".join(statement.split())
+
+
+class Histogram:
+    """
+    Counts observations into buckets by upper bound. Values above the last
+    bound are counted under ``+Inf``.
+    """
+
+    def __init__(self, buckets: typing.Sequence[float]) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        labels = [str(bound) for bound in self.buckets] + ["+Inf"]
+        with self._lock:
+            return {
+                "buckets": dict(zip(labels, self.counts)),
+                "count": self.count,
+                "sum": self.sum,
+                "max": self.max,
+            }
+
+
+class PoolStats:
+    """
+    Collects connection pool statistics for an engine using pool events.
+
+    The checkout latency is the time taken to get a connection from the pool,
+    including any time spent waiting for one to be returned. The connection
+    age is recorded each time a connection is checked out.
+    """
+
+    def __init__(self, engine: typing.Any) -> None:
+        from sqlalchemy import event
+
+        self.engine = engine
+        self.connects = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.invalidated = 0
+        self.checkout_latency = Histogram(DEFAULT_LATENCY_BUCKETS)
+        self.connection_age = Histogram(DEFAULT_AGE_BUCKETS)
+        self._lock = threading.Lock()
+
+        event.listen(engine, "connect", self.on_connect)
+        event.listen(engine, "checkout", self.on_checkout)
+        event.listen(engine, "checkin", self.on_checkin)
+        event.listen(engine, "invalidate", self.on_invalidate)
+
+        # every connection is requested through raw_connection, time it there
+        raw_connection = engine.raw_connection
+
+        @functools.wraps(raw_connection)
+        def timed_raw_connection(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return raw_connection(*args, **kwargs)
+            finally:
+                self.checkout_latency.observe(time.perf_counter() - start)
+
+        engine.raw_connection = timed_raw_connection
+
+    def on_connect(self, dbapi_connection, connection_record) -> None:
+        connection_record.info["connected_at"] = time.monotonic()
+        with self._lock:
+            self.connects += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, proxy) -> None:
+        connected_at = connection_record.info.get("connected_at")
+        if connected_at is not None:
+            self.connection_age.observe(time.monotonic() - connected_at)
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+
+    def on_checkin(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        with self._lock:
+            self.invalidated += 1
+
+    def snapshot(self) -> dict:
+        pool = self.engine.pool
+        stats = {
+            "pool": type(pool).__name__,
+            "size": None,
+            "overflow": None,
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "invalidated": self.invalidated,
+            "checkout_latency": self.checkout_latency.snapshot(),
+            "connection_age": self.connection_age.snapshot(),
+        }
+        # only the QueuePool can report on its size and overflow
+        if callable(getattr(pool, "overflow", None)):
+            stats["size"] = pool.size()
+            stats["overflow"] = pool.overflow()
+        return stats
+
+
+class NPlusOneQueryError(Exception):
+    pass
+
+
+class NPlusOneDetector:
+    """
+    Flags statements of the same shape executed ``threshold`` or more times
+    within a request, a sign of lazy loading relationships in a loop.
+
+    ``action`` is how they are reported, either ``log`` a warning, ``raise``
+    an `NPlusOneQueryError` (useful when testing) or add a ``header`` to the
+    response with the number of statements flagged.
+    """
+
+    actions = ("log", "raise", "header")
+    header_name = "x-repeated-queries"
+
+    def __init__(self, threshold: int = 10, action: str = "log") -> None:
+        if action not in self.actions:
+            raise ValueError(f"action must be one of {', '.join(self.actions)}")
+
+        self.threshold = threshold
+        self.action = action
+
+    def report(self, statement: str, stats: "QueryStats") -> None:
+        if self.action == "raise":
+            raise NPlusOneQueryError(
+                f"query executed {self.threshold} times in a request: {statement}"
+            )
+        if self.action == "log":
+            logger.warning(
+                "possible n+1 query, executed %d times in request %s: %s",
+                self.threshold,
+                stats.request_id,
+                statement,
+            )
+
+
+class QueryStats:
+    """
+    The number of queries executed and the time spent on them.
+
+    When tracking statements each statement's fingerprint is counted, which
+    is required by the ``detector``.
+    """
+
+    def __init__(
+        self,
+        request_id: typing.Any = None,
+        detector: typing.Optional[NPlusOneDetector] = None,
+        track_statements: bool = False,
+    ) -> None:
+        self.request_id = request_id
+        self.detector = detector
+        self.count = 0
+        self.duration = 0.0
+        self.statements: typing.Optional[typing.Counter[str]] = None
+        if detector is not None or track_statements:
+            self.statements = collections.Counter()
+        # fingerprints the detector has flagged
+        self.repeated: typing.List[str] = []
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+
+        if self.statements is None:
+            return
+
+        key = fingerprint(statement)
+        self.statements[key] += 1
+        if (
+            self.detector is not None
+            and self.statements[key] == self.detector.threshold
+        ):
+            self.repeated.append(key)
+            self.detector.report(key, self)
+
+    def summary(self) -> dict:
+        return {"count": self.count, "duration": self.duration}
+
+
+# stats recording every query regardless of the request, see `watch_queries`
+_watchers: typing.List[QueryStats] = []
+
+
+@contextlib.contextmanager
+def watch_queries(track_statements: bool = True) -> typing.Iterator[QueryStats]:
+    """
+    Record every query executed by an instrumented engine within the block,
+    from any thread or request.
+    """
+
+    stats = QueryStats(track_statements=track_statements)
+    _watchers.append(stats)
+    try:
+        yield stats
+    finally:
+        _watchers.remove(stats)
+
+
+def instrument_queries(
+    engine: typing.Any, slow_query_threshold: typing.Optional[float] = None
+) -> None:
+    """
+    Time every statement executed by the engine. Timings are added to the
+    current request's `QueryStats` and statements taking longer than
+    ``slow_query_threshold`` seconds are logged.
+    """
+
+    from sqlalchemy import event
+
+    from .middleware import get_query_stats
+
+    def before_cursor_execute(conn, cursor, statement, params, context, many):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, params, context, many):
+        duration = time.perf_counter() - conn.info["query_start_time"].pop()
+
+        stats = get_query_stats()
+        if stats is not None:
+            stats.record(statement, duration)
+        for watcher in _watchers:
+            watcher.record(statement, duration)
+
+        if slow_query_threshold is not None and duration >= slow_query_threshold:
+            logger.warning("slow query (%.3fs): %s", duration, statement)
+
+    def handle_error(exception_context):
+        # after_cursor_execute is not called for a failed statement
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
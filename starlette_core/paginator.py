@@ -1,19 +1,154 @@
+import base64
+import binascii
 import collections.abc
+import datetime
+import decimal
+import hashlib
 import inspect
+import json
+import typing
+import uuid
 from math import ceil
 
-from .exceptions import EmptyPage, InvalidPage, PageNotAnInteger
+import sqlalchemy as sa
+from sqlalchemy.orm import Query
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+
+from .cache import BaseCache, LocMemCache
+from .exceptions import EmptyPage, InvalidCursor, InvalidPage, PageNotAnInteger
 from .utils import method_has_no_args
 
+# shared between paginators so counts survive across requests
+count_cache = LocMemCache(max_entries=1000)
+
+
+class ApproximateCount(int):
+    """A count that is not exact, ie it was estimated or capped."""
+
+
+class ExactCount:
+    """Count using the object list's ``count()`` method or ``len()``."""
+
+    def __repr__(self):
+        return "ExactCount()"
+
+    def __call__(self, object_list):
+        c = getattr(object_list, "count", None)
+        if callable(c) and not inspect.isbuiltin(c) and method_has_no_args(c):
+            return c()
+        return len(object_list)
+
+
+class CappedCount:
+    """
+    Count no further than ``cap`` rows. When there are more an
+    ``ApproximateCount`` of ``cap`` is returned, ie to show "10000+".
+    """
+
+    def __init__(self, cap=10000):
+        self.cap = int(cap)
+
+    def __repr__(self):
+        return f"CappedCount({self.cap})"
+
+    def __call__(self, object_list):
+        if isinstance(object_list, Query):
+            count = object_list.limit(self.cap + 1).count()
+        else:
+            count = ExactCount()(object_list)
+
+        if count > self.cap:
+            return ApproximateCount(self.cap)
+        return count
+
+
+class EstimatedCount:
+    """
+    Use the query planner's row estimate for PostgreSQL queries. Estimates below
+    ``threshold`` are cheap enough to count exactly, as is everything else.
+    """
+
+    def __init__(self, threshold=1000):
+        self.threshold = int(threshold)
+
+    def __repr__(self):
+        return f"EstimatedCount({self.threshold})"
+
+    def __call__(self, object_list):
+        if isinstance(object_list, Query):
+            # the bind the query would be read from, which may be a replica
+            bind = object_list.session.get_bind(clause=object_list.statement)
+            if bind.dialect.name == "postgresql":
+                estimate = self.estimate(object_list, bind)
+                if estimate >= self.threshold:
+                    return ApproximateCount(estimate)
+        return ExactCount()(object_list)
+
+    def estimate(self, query, bind):
+        """Return the planner's estimated number of rows for the query."""
+
+        compiled = query.statement.compile(dialect=bind.dialect)
+        sql = f"EXPLAIN (FORMAT JSON) {compiled}"
+        if isinstance(bind, sa.engine.Connection):
+            plan = self._execute(bind, sql, compiled.params)
+        else:
+            with bind.connect() as connection:
+                plan = self._execute(connection, sql, compiled.params)
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def _execute(self, connection, sql, params):
+        execute = getattr(connection, "exec_driver_sql", connection.execute)
+        return execute(sql, params).scalar()
+
+
+class CachedCount:
+    """
+    Cache the result of another count strategy, keyed by the strategy's
+    ``repr()`` and the compiled SQL and parameters of a query. Object lists
+    other than queries are not cached.
+    """
+
+    def __init__(
+        self, strategy=None, timeout=60, cache: typing.Optional[BaseCache] = None
+    ):
+        self.strategy = strategy or ExactCount()
+        self.timeout = timeout
+        self.cache = count_cache if cache is None else cache
+
+    def get_key(self, object_list):
+        if not isinstance(object_list, Query):
+            return None
+        compiled = object_list.statement.compile()
+        params = sorted(compiled.params.items())
+        data = f"{self.strategy!r}:{compiled}:{params!r}".encode()
+        return "paginator.count:" + hashlib.sha1(data).hexdigest()
+
+    def __call__(self, object_list):
+        key = self.get_key(object_list)
+        if key is None:
+            return self.strategy(object_list)
+
+        count = self.cache.get(key)
+        if count is None:
+            count = self.strategy(object_list)
+            self.cache.set(key, count, self.timeout)
+        return count
+
 
 class Paginator:
-    def __init__(self, object_list, per_page):
+    def __init__(self, object_list, per_page, count_strategy=None, window_count=False):
         self.object_list = object_list
         self.per_page = int(per_page)
+        self.count_strategy = count_strategy or ExactCount()
+        # fetch the total with the page rows using count(*) OVER ()
+        self.window_count = window_count
         self._count = None
 
-    def validate_number(self, number):
-        """Validate the given 1-based page number."""
+    def _parse_number(self, number):
+        """Convert the given page number to an int greater than 0."""
 
         try:
             number = int(number)
@@ -22,7 +157,15 @@ class Paginator:
 
         if number < 1:
             raise EmptyPage("That page number is less than 1")
-        if number > self.num_pages and number != 1:
+
+        return number
+
+    def validate_number(self, number):
+        """Validate the given 1-based page number."""
+
+        number = self._parse_number(number)
+        # an approximate count can be short of the real number of pages
+        if number > self.num_pages and number != 1 and self.count_is_exact:
             raise EmptyPage("That page contains no results")
 
         return number
@@ -34,21 +177,57 @@ class Paginator:
         """
 
         try:
-            number = self.validate_number(number)
+            return self.page(number)
         except PageNotAnInteger:
-            number = 1
+            return self.page(1)
         except EmptyPage:
-            number = self.num_pages
-        return self.page(number)
+            return self.page(self.num_pages)
 
     def page(self, number):
         """Return a Page object for the given 1-based page number."""
 
+        if (
+            self.window_count
+            and self._count is None
+            and isinstance(self.object_list, Query)
+            # the window is counted before DISTINCT removes duplicate rows
+            and not self.object_list._distinct
+        ):
+            return self._window_page(number)
+
         number = self.validate_number(number)
         bottom = (number - 1) * self.per_page
         top = bottom + self.per_page
         return self._get_page(self.object_list[bottom:top], number, self)
 
+    def _window_page(self, number):
+        """
+        Return a Page object fetching the rows and the total count in a single
+        query. The page number is only checked against the count afterwards.
+        """
+
+        number = self._parse_number(number)
+        bottom = (number - 1) * self.per_page
+        entities = len(self.object_list.column_descriptions)
+
+        query = self.object_list.add_columns(sa.func.count().over().label("total"))
+        rows = query.limit(self.per_page).offset(bottom).all()
+
+        if not rows:
+            # there are no rows to carry the total so fall back to counting,
+            # unless this is the first page in which case there are none
+            if number == 1:
+                self._count = 0
+            self.validate_number(number)
+            return self._get_page([], number, self)
+
+        self._count = rows[0][-1]
+        if entities == 1:
+            object_list = [row[0] for row in rows]
+        else:
+            object_list = [tuple(row[:-1]) for row in rows]
+        return self._get_page(object_list, number, self)
+
     def _get_page(self, *args, **kwargs):
         """
         Return an instance of a single page.
@@ -62,17 +241,17 @@ class Paginator:
     def count(self):
         """Return the total number of objects, across all pages."""
 
-        if self._count:
-            return self._count
-
-        c = getattr(self.object_list, "count", None)
-        if callable(c) and not inspect.isbuiltin(c) and method_has_no_args(c):
-            self._count = c()
-        else:
-            self._count = len(self.object_list)
+        if self._count is None:
+            self._count = self.count_strategy(self.object_list)
 
         return self._count
 
+    @property
+    def count_is_exact(self):
+        """Return False when the count was estimated or capped."""
+
+        return not isinstance(self.count, ApproximateCount)
+
     @property
     def num_pages(self):
         """Return the total number of pages."""
@@ -121,3 +300,221 @@ class Page(collections.abc.Sequence):
     @property
     def has_other_pages(self):
         return self.has_previous or self.has_next
+
+
+class KeysetPaginator:
+    """
+    Paginate a SQLAlchemy query by seeking past the key of the last row shown
+    rather than using OFFSET, so every page costs the same to fetch.
+
+    ``keys`` are the columns the query is ordered by, ie ``[User.name, User.id]``.
+    Wrap a column with ``.desc()`` for descending order. The final key must be
+    unique so rows can not be skipped, the primary key is a good choice.
+    Any existing ordering on the query is replaced by the keys, which must not
+    be nullable.
+
+    Key values are encoded into the cursor as json, dates, times, decimals
+    and uuids as strings. Override `encode_value` and `decode_value` for
+    other types.
+    """
+
+    def __init__(self, query, per_page, keys):
+        self.query = query
+        self.per_page = int(per_page)
+        self.keys = []
+
+        for key in keys:
+            descending = False
+            if isinstance(key, UnaryExpression) and key.modifier in (
+                operators.desc_op,
+                operators.asc_op,
+            ):
+                descending = key.modifier is operators.desc_op
+                key = key.element
+            # rows can't be seeked past a NULL, ``key > NULL`` matches nothing
+            if getattr(getattr(key, "expression", key), "nullable", False):
+                raise ValueError(f"key column {key} must not be nullable")
+            self.keys.append((key, descending))
+
+        if not self.keys:
+            raise ValueError("at least one key column is required")
+
+    def encode_cursor(self, values, backwards=False):
+        """Return an opaque cursor for the given key values."""
+
+        values = list(values)
+        if len(values) != len(self.keys):
+            raise ValueError(f"expected {len(self.keys)} key values, got {len(values)}")
+        values = [
+            self.encode_value(key, value) for (key, _), value in zip(self.keys, values)
+        ]
+        data = json.dumps({"v": values, "b": backwards}).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """Return the ``(values, backwards)`` encoded in the cursor."""
+
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values, backwards = data["v"], bool(data["b"])
+        except (
+            AttributeError,
+            TypeError,
+            ValueError,
+            KeyError,
+            binascii.Error,
+        ) as err:
+            raise InvalidCursor("That cursor is not valid") from err
+
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise InvalidCursor("That cursor is not valid")
+
+        try:
+            values = [
+                self.decode_value(key, value)
+                for (key, _), value in zip(self.keys, values)
+            ]
+        except (AttributeError, TypeError, ValueError, ArithmeticError) as err:
+            raise InvalidCursor("That cursor is not valid") from err
+
+        return values, backwards
+
+    def encode_value(self, key, value):
+        """Return a key value as a json serializable value."""
+
+        if isinstance(value, (datetime.date, datetime.time)):
+            return value.isoformat()
+        if isinstance(value, (decimal.Decimal, uuid.UUID)):
+            return str(value)
+        return value
+
+    def decode_value(self, key, value):
+        """
+        Return the key value from its json value, raising a TypeError or
+        ValueError if it isn't a valid value for the key's column.
+        """
+
+        if not isinstance(value, (str, int, float)):
+            raise TypeError(f"{value!r} is not a key value")
+
+        try:
+            python_type = key.type.python_type
+        except (AttributeError, NotImplementedError):
+            return value
+
+        # datetime is a subclass of date so must be checked first
+        if issubclass(python_type, datetime.datetime):
+            return datetime.datetime.fromisoformat(value)
+        if issubclass(python_type, datetime.date):
+            return datetime.date.fromisoformat(value)
+        if issubclass(python_type, datetime.time):
+            return datetime.time.fromisoformat(value)
+        if issubclass(python_type, decimal.Decimal):
+            return decimal.Decimal(str(value))
+        if issubclass(python_type, uuid.UUID):
+            return uuid.UUID(value)
+        if python_type is float and isinstance(value, int):
+            return value
+        if python_type in (int, float, str) and not isinstance(value, python_type):
+            raise TypeError(f"{value!r} is not a {python_type.__name__}")
+        return value
+
+    def get_page(self, cursor=None):
+        """Return a valid page, the first page is returned for an invalid cursor."""
+
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    def page(self, cursor=None):
+        """Return a KeysetPage for the given cursor, or the first page."""
+
+        if not cursor:
+            values, backwards = None, False
+        else:
+            values, backwards = self.decode_cursor(cursor)
+
+        query = self.query.order_by(None).order_by(
+            *[
+                key.desc() if descending != backwards else key.asc()
+                for key, descending in self.keys
+            ]
+        )
+        if values is not None:
+            query = query.filter(self._seek_clause(values, backwards))
+
+        # fetch an extra row to find out if there is another page beyond this one
+        rows = query.limit(self.per_page + 1).all()
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return self._get_page(rows, self, has_next, has_previous)
+
+    def _seek_clause(self, values, backwards):
+        """Return the clause that selects rows beyond the given key values."""
+
+        clauses = []
+        for i, (key, descending) in enumerate(self.keys):
+            equal = [k == v for (k, _), v in zip(self.keys[:i], values[:i])]
+            beyond = key < values[i] if descending != backwards else key > values[i]
+            clauses.append(sa.and_(*equal, beyond))
+        return sa.or_(*clauses)
+
+    def _get_page(self, *args, **kwargs):
+        """
+        Return an instance of a single page.
+        This hook can be used by subclasses to use an alternative to the
+        standard :cls:`KeysetPage` object.
+        """
+
+        return KeysetPage(*args, **kwargs)
+
+    def get_key(self, obj):
+        """Return the key values for a row."""
+
+        return [getattr(obj, key.key) for key, _ in self.keys]
+
+
+class KeysetPage(collections.abc.Sequence):
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self)} items>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        if not isinstance(index, (int, slice)):
+            raise TypeError
+        return self.object_list[index]
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.object_list:
+            return None
+        values = self.paginator.get_key(self.object_list[-1])
+        return self.paginator.encode_cursor(values)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.object_list:
+            return None
+        values = self.paginator.get_key(self.object_list[0])
+        return self.paginator.encode_cursor(values, backwards=True)
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
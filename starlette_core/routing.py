@@ -0,0 +1,71 @@
+import typing
+
+from starlette.datastructures import URLPath
+from starlette.requests import Request
+from starlette.routing import Host, Mount, NoMatchFound, Router
+
+
+def may_reverse(route: typing.Any, name: str) -> bool:
+    """Return False if the route can't have a url for the name."""
+
+    if isinstance(route, (Mount, Host)):
+        return (
+            route.name is None
+            or name == route.name
+            or name.startswith(f"{route.name}:")
+        )
+    if hasattr(route, "name"):
+        return route.name == name
+    return True
+
+
+class RouteIndex:
+    """
+    Reverses route names without trying every route of the router. The
+    routes that may have a url for a name are found on its first use, and
+    are tried in the same order as `Router.url_path_for` would.
+    """
+
+    def __init__(self, router: Router) -> None:
+        self.router = router
+        self._num_routes = len(router.routes)
+        self._candidates: typing.Dict[str, list] = {}
+
+    def get_routes(self, name: str) -> list:
+        if len(self.router.routes) != self._num_routes:
+            # routes have been added since the index was built
+            self._candidates = {}
+            self._num_routes = len(self.router.routes)
+
+        try:
+            return self._candidates[name]
+        except KeyError:
+            routes = [r for r in self.router.routes if may_reverse(r, name)]
+            self._candidates[name] = routes
+            return routes
+
+    def url_path_for(self, name: str, **path_params: typing.Any) -> URLPath:
+        for route in self.get_routes(name):
+            try:
+                return route.url_path_for(name, **path_params)
+            except NoMatchFound:
+                pass
+        raise NoMatchFound(name, path_params)
+
+
+def get_route_index(router: Router) -> RouteIndex:
+    """Return the router's index, which is kept on the router."""
+
+    index = getattr(router, "_route_index", None)
+    if index is None:
+        index = router._route_index = RouteIndex(router)  # type: ignore
+    return index
+
+
+def url_for(request: Request, name: str, **path_params: typing.Any) -> str:
+    """`Request.url_for` using the router's `RouteIndex`."""
+
+    url_path = get_route_index(request.scope["router"]).url_path_for(
+        name, **path_params
+    )
+    return url_path.make_absolute_url(base_url=request.base_url)
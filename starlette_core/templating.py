@@ -1,21 +1,178 @@
 import typing
+from concurrent.futures import ProcessPoolExecutor
 
 from starlette import templating
+from starlette.background import BackgroundTask
 from starlette.datastructures import QueryParams
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
 from wtforms import fields, form
 
+from . import routing
+from .cache import LocMemCache
 from .config import config
 from .messages import get_messages
+from .utils import chunked
 
 try:
     import jinja2
+    from jinja2 import bccache
+
+    from .fragment_cache import CacheExtension
 except ImportError:  # pragma: nocover
     jinja2 = None  # type: ignore
 
+# compiled templates shared by every environment using the memory bytecode cache
+bytecode_cache = LocMemCache(max_entries=1000, default_timeout=None)
+
+
+def get_bytecode_cache(
+    enable_async: bool = False,
+) -> typing.Optional["bccache.BytecodeCache"]:
+    """Return the bytecode cache set by ``config.jinja2_bytecode_cache``."""
+
+    # templates compile differently for async environments, so are kept apart
+    mode = "async" if enable_async else "sync"
+
+    if not config.jinja2_bytecode_cache:
+        return None
+    if config.jinja2_bytecode_cache == "memory":
+        return bccache.MemcachedBytecodeCache(
+            bytecode_cache, prefix=f"jinja2/bytecode/{mode}/"
+        )
+    if config.jinja2_bytecode_cache == "filesystem":
+        return bccache.FileSystemBytecodeCache(
+            config.jinja2_bytecode_cache_dir or None, f"__jinja2_{mode}_%s.cache"
+        )
+    raise ValueError(
+        "jinja2_bytecode_cache must be one of memory or filesystem, "
+        f"not {config.jinja2_bytecode_cache}"
+    )
+
+
+def memoize(request: typing.Any, key: tuple, func: typing.Callable) -> typing.Any:
+    """
+    Return the result of ``func`` kept for the rest of the request, or call
+    it every time when there is no request or the key can't be hashed.
+    """
+
+    scope = getattr(request, "scope", None)
+    if scope is None:
+        return func()
+
+    cache = scope.setdefault("starlette_core.template_cache", {})
+    try:
+        return cache[key]
+    except KeyError:
+        value = cache[key] = func()
+        return value
+    except TypeError:
+        return func()
+
+
+def _precompile(
+    templates_class: typing.Type["Jinja2Templates"],
+    loader: typing.Any,
+    enable_async: bool,
+    names: typing.List[str],
+) -> int:
+    return templates_class(loader, enable_async=enable_async).precompile(names)
+
+
+async def _buffered(
+    chunks: typing.AsyncIterator[str], size: int
+) -> typing.AsyncIterator[str]:
+    """Join chunks until they are at least ``size`` characters long."""
+
+    buffer: typing.List[str] = []
+    length = 0
+    async for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+class _StreamingTemplateResponse(StreamingResponse):
+    """
+    Sends a template as it is rendered. Jinja produces many small chunks, these
+    are joined into chunks of at least ``chunk_size`` characters to be sent.
+    """
+
+    media_type = "text/html"
+    chunk_size = 4096
+
+    def __init__(
+        self,
+        template: typing.Any,
+        context: dict,
+        status_code: int = 200,
+        headers: typing.Optional[typing.Mapping[str, str]] = None,
+        media_type: typing.Optional[str] = None,
+        background: typing.Optional[BackgroundTask] = None,
+    ) -> None:
+        self.template = template
+        self.context = context
+        content = _buffered(template.generate_async(context), self.chunk_size)
+        super().__init__(content, status_code, headers, media_type, background)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request = self.context.get("request", {})
+        extensions = request.get("extensions", {})
+        if "http.response.template" in extensions:
+            await send(
+                {
+                    "type": "http.response.template",
+                    "template": self.template,
+                    "context": self.context,
+                }
+            )
+        await super().__call__(scope, receive, send)
+
+
+class _AsyncTemplateResponse(templating._TemplateResponse):
+    """
+    A `TemplateResponse` for an ``enable_async`` environment. The template is
+    rendered with ``render_async`` when the response is sent, as ``render``
+    can't be called from within a running event loop.
+    """
+
+    def __init__(
+        self,
+        template: typing.Any,
+        context: dict,
+        status_code: int = 200,
+        headers: typing.Optional[typing.Mapping[str, str]] = None,
+        media_type: typing.Optional[str] = None,
+        background: typing.Optional[BackgroundTask] = None,
+    ) -> None:
+        # not rendered here, so the base __init__ isn't called
+        self.template = template
+        self.context = context
+        self.status_code = status_code
+        if media_type is not None:
+            self.media_type = media_type
+        self.background = background
+        # the content length is added once the body has been rendered
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.body = self.render(await self.template.render_async(self.context))
+        if "content-length" not in self.headers and not (
+            self.status_code < 200 or self.status_code in (204, 304)
+        ):
+            self.headers["content-length"] = str(len(self.body))
+        await super().__call__(scope, receive, send)
+
 
 class Jinja2Templates(templating.Jinja2Templates):
-    def __init__(self, loader: "jinja2.BaseLoader") -> None:
+    def __init__(self, loader: "jinja2.BaseLoader", enable_async: bool = False) -> None:
         assert jinja2 is not None, "jinja2 must be installed to use Jinja2Templates"
+        self.enable_async = enable_async
         self.env = self.get_environment(loader)
 
     def get_environment(self, loader: "jinja2.BaseLoader") -> "jinja2.Environment":
@@ -30,15 +187,33 @@ class Jinja2Templates(templating.Jinja2Templates):
         @jinja2.pass_context
         def url_for(context: dict, name: str, **path_params: typing.Any) -> str:
             request = context["request"]
-            return request.url_for(name, **path_params)
+            key = ("url_for", name, tuple(sorted(path_params.items())))
+            return memoize(
+                request, key, lambda: routing.url_for(request, name, **path_params)
+            )
 
-        def url_params_update(init: QueryParams, **new: typing.Any) -> QueryParams:
-            values = dict(init)
-            values.update(new)
-            return QueryParams(**values)
+        @jinja2.pass_context
+        def url_params_update(
+            context: dict, init: QueryParams, **new: typing.Any
+        ) -> QueryParams:
+            def update() -> QueryParams:
+                values = dict(init)
+                values.update(new)
+                return QueryParams(**values)
+
+            # keyed by the instance, usually request.query_params for every call
+            key = ("url_params_update", id(init), tuple(sorted(new.items())))
+            cached = memoize(context.get("request"), key, lambda: (init, update()))
+            if cached[0] is not init:
+                return update()
+            return cached[1]
 
         env = jinja2.Environment(
-            extensions=list(config.jinja2_extensions), loader=loader, autoescape=True
+            extensions=[*config.jinja2_extensions, CacheExtension],
+            loader=loader,
+            autoescape=True,
+            bytecode_cache=get_bytecode_cache(self.enable_async),
+            enable_async=self.enable_async,
         )
 
         env.globals["get_messages"] = get_request_messages
@@ -47,3 +222,96 @@ class Jinja2Templates(templating.Jinja2Templates):
         env.globals["url_params_update"] = url_params_update
 
         return env
+
+    def precompile(
+        self,
+        names: typing.Optional[typing.List[str]] = None,
+        processes: typing.Optional[int] = None,
+    ) -> int:
+        """
+        Load and compile templates ahead of their first use, every template
+        the loader can list by default. Returns the number compiled.
+
+        With a filesystem bytecode cache the templates can be compiled by a
+        pool of ``processes``, after which loading them here only reads the
+        cache. The loader must be picklable to do so.
+        """
+
+        if names is None:
+            names = self.env.list_templates()
+
+        if processes and isinstance(
+            self.env.bytecode_cache, bccache.FileSystemBytecodeCache
+        ):
+            size = max(1, len(names) // processes)
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = [
+                    executor.submit(
+                        _precompile,
+                        type(self),
+                        self.env.loader,
+                        self.enable_async,
+                        chunk,
+                    )
+                    for chunk in chunked(names, size)
+                ]
+                # raises any error from a worker, ie the loader can't be pickled
+                for future in futures:
+                    future.result()
+
+        for name in names:
+            self.env.get_template(name)
+        return len(names)
+
+    def TemplateResponse(
+        self,
+        name: str,
+        context: dict,
+        status_code: int = 200,
+        headers: typing.Optional[typing.Mapping[str, str]] = None,
+        media_type: typing.Optional[str] = None,
+        background: typing.Optional[BackgroundTask] = None,
+    ) -> templating._TemplateResponse:
+        if not self.env.is_async:
+            return super().TemplateResponse(
+                name, context, status_code, headers, media_type, background
+            )
+        if "request" not in context:
+            raise ValueError('context must include a "request" key')
+        template = self.get_template(name)
+        return _AsyncTemplateResponse(
+            template,
+            context,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            background=background,
+        )
+
+    def StreamingTemplateResponse(
+        self,
+        name: str,
+        context: dict,
+        status_code: int = 200,
+        headers: typing.Optional[typing.Mapping[str, str]] = None,
+        media_type: typing.Optional[str] = None,
+        background: typing.Optional[BackgroundTask] = None,
+    ) -> _StreamingTemplateResponse:
+        """
+        A `TemplateResponse` that sends the page as it is rendered rather than
+        once it has all been rendered. Requires ``enable_async``.
+        """
+
+        if not self.env.is_async:
+            raise RuntimeError("enable_async is required to stream templates")
+        if "request" not in context:
+            raise ValueError('context must include a "request" key')
+        template = self.get_template(name)
+        return _StreamingTemplateResponse(
+            template,
+            context,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            background=background,
+        )
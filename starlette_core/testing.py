@@ -1,6 +1,8 @@
+import contextlib
 import typing
 
 from .database import Base
+from .monitoring import QueryStats, watch_queries
 
 
 def assert_model_field(
@@ -49,6 +51,28 @@ def assert_model_field(
         assert field.type.length == length
 
 
+@contextlib.contextmanager
+def assert_max_queries(num: int) -> typing.Iterator[QueryStats]:
+    """
+    Assert no more than ``num`` queries are executed within the block,
+    including those made by requests to a test client.
+
+    :param num: The maximum number of queries allowed
+    """
+
+    with watch_queries() as stats:
+        yield stats
+
+    if stats.count > num:
+        statements = "\n".join(
+            f"{count}x {statement}"
+            for statement, count in stats.statements.most_common()  # type: ignore
+        )
+        raise AssertionError(
+            f"{stats.count} queries executed, expected at most {num}:\n{statements}"
+        )
+
+
 class DummyPostData(dict):
     def getlist(self, key):
         v = self[key]
@@ -1,4 +1,7 @@
+import functools
 import inspect
+import itertools
+import typing
 from importlib import import_module
 
 
@@ -24,6 +27,22 @@ def import_string(dotted_path: str):
         ) from err
 
 
+@functools.lru_cache(maxsize=None)
+def cached_import_string(dotted_path: str):
+    """
+    `import_string` that remembers what each dotted path resolved to, for paths
+    read from settings on every use. Failed imports are not remembered.
+    """
+
+    return import_string(dotted_path)
+
+
+def clear_import_cache() -> None:
+    """Forget the paths resolved by `cached_import_string`."""
+
+    cached_import_string.cache_clear()
+
+
 def method_has_no_args(meth):
     """Return True if a method only accepts 'self'."""
 
@@ -35,3 +54,17 @@ def method_has_no_args(meth):
         ]
     )
     return count == 0 if inspect.ismethod(meth) else count == 1
+
+
+def chunked(iterable: typing.Iterable, size: int) -> typing.Iterator[list]:
+    """Split an iterable into lists of at most ``size`` items."""
+
+    if size < 1:
+        raise ValueError("size must be greater than 0")
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
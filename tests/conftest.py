@@ -1,9 +1,12 @@
 import pytest
+from sqlalchemy.pool import StaticPool
 
 from starlette_core.database import Database, DatabaseURL
 
 url = DatabaseURL("sqlite://")
-database = Database(url)
+# share the single in memory connection so it can be used from other threads
+engine_kwargs = {"connect_args": {"check_same_thread": False}, "poolclass": StaticPool}
+database = Database(url, engine_kwargs=engine_kwargs)
 
 
 @pytest.fixture()
@@ -0,0 +1,89 @@
+import fnmatch
+
+from mock import patch
+
+from starlette_core.cache import LocMemCache, RedisCache
+
+
+def test_locmem_cache():
+    cache = LocMemCache()
+
+    assert cache.get("a") is None
+    assert cache.get("a", 1) == 1
+
+    cache.set("a", 0)
+    assert cache.get("a") == 0
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    cache.delete("a")
+    assert cache.get("a") is None
+
+    cache.set("a", 1)
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_locmem_cache_timeout():
+    cache = LocMemCache(default_timeout=10)
+
+    with patch("time.monotonic", return_value=100):
+        cache.set("a", 1)
+        cache.set("b", 2, timeout=None)
+        cache.set("c", 3, timeout=20)
+
+    with patch("time.monotonic", return_value=115):
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        assert cache.get("c") == 3
+
+
+def test_locmem_cache_evicts_least_recently_used():
+    cache = LocMemCache(max_entries=2)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expiries = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.expiries[key] = ex
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in self.data if fnmatch.fnmatch(key, match)]
+
+
+def test_redis_cache():
+    client = FakeRedis()
+    client.set("other", b"1")
+    cache = RedisCache(client, key_prefix="app:", default_timeout=10)
+
+    assert cache.get("a", 1) == 1
+    cache.set("a", {"b": 1})
+    cache.set("c", 2, timeout=None)
+    assert cache.get("a") == {"b": 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert client.expiries == {"other": None, "app:a": 10, "app:c": None}
+
+    cache.delete("a")
+    assert cache.get("a") is None
+
+    cache.clear()
+    assert list(client.data) == ["other"]
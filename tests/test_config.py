@@ -1,7 +1,18 @@
+import pytest
+
 from starlette_core import config
+from starlette_core.config import AppConfig, Setting, Settings
 
 
 def test_defaults():
+    assert config.database_url is None
+    assert list(config.database_replica_urls) == []
+    assert config.database_pool_size == 5
+    assert config.database_max_overflow == 10
+    assert config.database_pool_recycle == -1
+    assert config.database_pool_pre_ping is False
+    assert config.database_statement_timeout is None
+    assert config.database_echo is False
     assert config.email_backend == "starlette_core.mail.backends.smtp.EmailBackend"
     assert config.email_default_from_address == ""
     assert config.email_default_from_name == ""
@@ -11,3 +22,75 @@ def test_defaults():
     assert str(config.email_password) == ""
     assert config.email_use_tls is False
     assert config.email_timeout is None
+    assert config.email_pool_size == 4
+    assert config.email_pool_keepalive == 30
+    assert config.email_queue_backend == (
+        "starlette_core.mail.backends.smtp.EmailBackend"
+    )
+    assert config.email_queue_size == 1000
+    assert config.email_queue_path == ""
+    assert config.email_queue_batch_size == 50
+    assert config.email_queue_max_retries == 5
+    assert config.email_file_path == "mail.mbox"
+    assert config.email_file_max_bytes == 10485760
+    assert list(config.jinja2_extensions) == []
+    assert config.jinja2_bytecode_cache == ""
+    assert config.jinja2_bytecode_cache_dir == ""
+    assert config.messages_storage == "starlette_core.messages.SessionStorage"
+
+
+def test_settings_are_read_on_first_use():
+    environ = {"EMAIL_PORT": "25"}
+    app_config = AppConfig(env_file=None, environ=environ)
+    assert app_config._values == {}
+
+    assert app_config.email_port == 25
+    environ["EMAIL_PORT"] = "2525"
+    assert app_config.email_port == 25
+
+    app_config.reload()
+    assert app_config.email_port == 2525
+
+
+def test_settings_can_be_set():
+    app_config = AppConfig(env_file=None, environ={"EMAIL_HOST": "mail"})
+
+    app_config.email_host = "othermail"
+    assert app_config.email_host == "othermail"
+
+    with pytest.raises(AttributeError):
+        app_config.email_hots = "mail"
+
+    app_config.reload()
+    assert app_config.email_host == "mail"
+
+
+def test_sections(env_file):
+    class Search(Settings):
+        url = Setting("SEARCH_URL", default="http://localhost:9200")
+        timeout = Setting("SEARCH_TIMEOUT", cast=float, default=1.0)
+
+    AppConfig.register_section("search", Search)
+    try:
+        app_config = AppConfig(env_file=env_file, environ={})
+        assert app_config.search.timeout == 2.5
+        assert app_config.search.url == "http://localhost:9200"
+        assert app_config.search is app_config.search
+    finally:
+        del AppConfig.sections["search"]
+
+    with pytest.raises(AttributeError):
+        app_config.search
+
+
+@pytest.fixture
+def env_file(tmp_path):
+    path = tmp_path / ".env"
+    path.write_text("SEARCH_TIMEOUT=2.5\n")
+    return str(path)
+
+
+def test_database_url_is_cast():
+    app_config = AppConfig(env_file=None, environ={"DATABASE_URL": "sqlite:///db"})
+    assert app_config.database_url.dialect == "sqlite"
+    assert app_config.database_url.database == "db"
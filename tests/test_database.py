@@ -1,14 +1,38 @@
+import asyncio
+import time
+
 import pytest
 import sqlalchemy as sa
+from sqlalchemy.pool import QueuePool
 from starlette.exceptions import HTTPException
 
-from starlette_core.database import Base, Session
+from starlette_core import config
+from starlette_core.database import (
+    AsyncDatabase,
+    Base,
+    Database,
+    DatabaseURL,
+    ReplicaRouter,
+    Session,
+    engine_kwargs_from_config,
+    metadata,
+    use_primary,
+)
+from starlette_core.middleware import _request_id_ctx_var
+from starlette_core.paginator import EstimatedCount
+
+from .conftest import database, engine_kwargs, url
 
 
 class User(Base):
     name = sa.Column(sa.String(50))
 
 
+class Pair(Base):
+    b = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String(50))
+
+
 def test_database(db):
     # connects ok
     db.engine.connect()
@@ -77,6 +101,70 @@ def test_declarative_base__refresh_from_db(db):
     assert user.name == "ted"
 
 
+def test_declarative_base__bulk_save(db):
+    db.create_all()
+
+    count = User.bulk_save((User(name=f"user {i}") for i in range(25)), batch_size=10)
+
+    assert count == 25
+    assert User.query.count() == 25
+
+
+def test_declarative_base__bulk_save_rolls_back(db):
+    db.create_all()
+
+    users = [User(id=1, name="ted"), User(id=1, name="sam")]
+
+    with pytest.raises(sa.exc.IntegrityError):
+        User.bulk_save(users)
+
+    assert User.query.count() == 0
+
+
+def test_declarative_base__bulk_delete(db):
+    db.create_all()
+
+    User.bulk_save((User(id=i, name=f"user {i}") for i in range(1, 11)))
+    users = User.query.filter(User.id <= 3).all()
+
+    # instances and primary keys can be mixed
+    assert User.bulk_delete(users + [4, 5, 1000], batch_size=2) == 5
+    assert User.query.count() == 5
+
+
+def test_declarative_base__bulk_upsert(db):
+    db.create_all()
+
+    User(id=1, name="ted").save()
+
+    mappings = [{"id": 1, "name": "sam"}, {"id": 2, "name": "bill"}, {"name": "jo"}]
+    assert User.bulk_upsert(mappings, batch_size=2) == (2, 1)
+
+    Session.expire_all()
+    assert User.query.get(1).name == "sam"
+    assert sorted(u.name for u in User.query) == ["bill", "jo", "sam"]
+
+
+def test_declarative_base__bulk_composite_primary_key(db):
+    db.create_all()
+
+    Pair.bulk_save([Pair(id=1, b=1), Pair(id=1, b=2), Pair(id=2, b=1)])
+    pair = Pair.query.get((1, 1))
+
+    # only the rows matching the whole primary key are deleted
+    assert Pair.bulk_delete([pair, (2, 1)]) == 2
+    assert [(p.id, p.b) for p in Pair.query] == [(1, 2)]
+
+    with pytest.raises(ValueError):
+        Pair.bulk_delete([1])
+
+    mappings = [{"id": 1, "b": 2, "name": "ted"}, {"id": 1, "b": 3, "name": "sam"}]
+    assert Pair.bulk_upsert(mappings) == (1, 1)
+
+    Session.expire_all()
+    assert sorted((p.b, p.name) for p in Pair.query) == [(2, "ted"), (3, "sam")]
+
+
 def test_declarative_base__can_be_deleted(db):
     class OrderA(Base):
         user_id = sa.Column(sa.Integer, sa.ForeignKey(User.id))
@@ -153,3 +241,276 @@ def test_declarative_base__query(db):
     with pytest.raises(HTTPException) as e:
         User.query.get_or_404(1000)
     assert e.value.status_code == 404
+
+
+@pytest.fixture()
+def async_db():
+    async_database = AsyncDatabase(url, engine_kwargs=engine_kwargs, max_workers=2)
+    Session.remove()
+    yield async_database
+    async_database.truncate_all(force=True)
+    Session.remove()
+    async_database.close()
+    # restore the default database
+    Session.configure(bind=database.engine)
+
+
+def test_async_database(async_db):
+    async def run():
+        await async_db.acreate_all()
+        token = _request_id_ctx_var.set("request-1")
+
+        try:
+            user = User(name="ted")
+            await user.asave()
+            assert await User.query.aget_or_404(user.id) == user
+
+            user.name = "sam"
+            await user.arefresh_from_db()
+            assert user.name == "ted"
+
+            await user.adelete()
+            with pytest.raises(HTTPException):
+                await User.query.aget_or_404(user.id)
+        finally:
+            Session.remove()
+            _request_id_ctx_var.reset(token)
+
+    asyncio.run(run())
+
+
+def test_async_database__uses_request_session(async_db):
+    async def run():
+        token = _request_id_ctx_var.set("request-1")
+        try:
+            # the worker thread resolves the same scoped session
+            session = await async_db.run(Session)
+            assert session is Session()
+        finally:
+            Session.remove()
+            _request_id_ctx_var.reset(token)
+
+    asyncio.run(run())
+
+
+def test_async_database__requires_request(async_db):
+    async def run():
+        with pytest.raises(RuntimeError):
+            await User.query.aget_or_404(1)
+
+    asyncio.run(run())
+
+
+def test_async_database__serializes_request_calls(async_db):
+    running = []
+    overlapped = []
+
+    def call(i):
+        # the session must not be used by two threads at once
+        overlapped.append(bool(running))
+        running.append(i)
+        time.sleep(0.01)
+        running.remove(i)
+        return Session()
+
+    async def run():
+        token = _request_id_ctx_var.set("request-1")
+        try:
+            sessions = await asyncio.gather(*[async_db.run(call, i) for i in range(4)])
+            assert len(set(map(id, sessions))) == 1
+
+            # other requests are not held up
+            _request_id_ctx_var.set("request-2")
+            other = await async_db.run(Session)
+            assert other is not sessions[0]
+        finally:
+            Session.remove()
+            _request_id_ctx_var.set("request-1")
+            Session.remove()
+            _request_id_ctx_var.reset(token)
+
+    asyncio.run(run())
+    assert overlapped == [False] * 4
+
+
+@pytest.fixture()
+def replica_db():
+    replica_url = DatabaseURL("sqlite://")
+    replica_database = Database(
+        url, engine_kwargs=engine_kwargs, replica_urls=[replica_url, replica_url]
+    )
+    Session.remove()
+    yield replica_database
+    Session.remove()
+    # restore the default database
+    Session.configure(bind=database.engine, router=None)
+
+
+def test_database_replicas(replica_db):
+    metadata.create_all(replica_db.engine)
+    for engine in replica_db.replica_engines:
+        metadata.create_all(engine)
+        engine.execute(User.__table__.insert(), name="replica")
+    replica_db.engine.execute(User.__table__.insert(), name="primary")
+
+    # reads are spread across the replicas
+    assert User.query.one().name == "replica"
+    session = Session()
+    binds = [session.get_bind(clause=sa.select([User.id])) for _ in range(2)]
+    assert binds == replica_db.replica_engines[::-1]
+
+    # getting a bind or connection without a write doesn't tie the session
+    # to the primary, ie for the dialect when counting a query
+    session.get_bind()
+    session.connection()
+    assert EstimatedCount()(User.query) == 1
+    assert session.get_bind(clause=sa.select([User.id])) in replica_db.replica_engines
+
+    # reads can be sent to the primary
+    with use_primary():
+        assert User.query.one().name == "primary"
+    assert User.query.one().name == "replica"
+
+    # after a write all reads are sent to the primary
+    User(name="ted").save()
+    assert User.query.count() == 2
+
+    # until the session is removed
+    Session.remove()
+    assert User.query.count() == 1
+
+    # as are reads after a write made within a use_primary() block
+    with use_primary():
+        User(name="sam").save()
+    assert User.query.count() == 3
+    Session.remove()
+
+
+def test_database_replicas_bulk_upsert(replica_db):
+    metadata.create_all(replica_db.engine)
+    for engine in replica_db.replica_engines:
+        metadata.create_all(engine)
+    replica_db.engine.execute(User.__table__.insert(), id=1, name="ted")
+
+    # the replicas are behind, existing rows are found on the primary
+    mappings = [{"id": 1, "name": "sam"}, {"id": 2, "name": "jo"}]
+    assert User.bulk_upsert(mappings) == (1, 1)
+    names = replica_db.engine.execute(sa.select([User.name]).order_by(User.id))
+    assert [name for name, in names] == ["sam", "jo"]
+
+
+def test_database_replicas_least_connections():
+    engines = [
+        sa.create_engine("sqlite://", poolclass=QueuePool),
+        sa.create_engine("sqlite://", poolclass=QueuePool),
+    ]
+    router = ReplicaRouter(engines, strategy="least_connections")
+
+    with engines[0].connect():
+        assert router.choose() is engines[1]
+
+    with pytest.raises(ValueError):
+        ReplicaRouter(engines, strategy="random")
+    with pytest.raises(ValueError):
+        ReplicaRouter([])
+
+
+def test_database__truncate_only_dirty_tables(db):
+    db.create_all()
+    db.truncate_all(force=True)
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sa.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    User(name="ted").save()
+    statements.clear()
+    db.truncate_all(force=True)
+    assert statements == ["DELETE FROM user"]
+    assert User.query.count() == 0
+
+    # nothing written since
+    statements.clear()
+    db.truncate_all(force=True)
+    assert statements == []
+
+    # raw sql could have written to any table
+    db.engine.execute("SELECT 1")
+    statements.clear()
+    db.truncate_all(force=True)
+    assert len(statements) == len(metadata.sorted_tables)
+
+    sa.event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_database__rollback_transaction(db):
+    db.create_all()
+    db.truncate_all(force=True)
+
+    with db.rollback_transaction(force=True):
+        User(name="ted").save()
+
+        # a failed commit only rolls back to the last savepoint
+        with pytest.raises(sa.exc.IntegrityError):
+            User(id=User.query.one().id, name="sam").save()
+
+        User(name="bill").save()
+        assert User.query.count() == 2
+
+    assert User.query.count() == 0
+
+    with pytest.raises(Exception):
+        with db.rollback_transaction():
+            pass
+
+
+@pytest.fixture()
+def database_config():
+    yield config
+    config.reload()
+    Session.remove()
+    # restore the default database
+    Session.configure(bind=database.engine, router=None)
+
+
+def test_engine_kwargs_from_config(database_config):
+    config.database_statement_timeout = 5000
+    config.database_pool_size = 20
+
+    assert engine_kwargs_from_config(DatabaseURL("postgresql://localhost/db")) == {
+        "echo": False,
+        "pool_pre_ping": False,
+        "pool_size": 20,
+        "max_overflow": 10,
+        "pool_recycle": -1,
+        "connect_args": {"options": "-c statement_timeout=5000"},
+    }
+    mysql_kwargs = engine_kwargs_from_config(DatabaseURL("mysql://localhost/db"))
+    assert mysql_kwargs["connect_args"] == {
+        "init_command": "SET SESSION max_execution_time=5000"
+    }
+    # no pool or statement timeout for sqlite
+    assert engine_kwargs_from_config(DatabaseURL("sqlite://")) == {
+        "echo": False,
+        "pool_pre_ping": False,
+    }
+
+
+def test_database_from_config(database_config):
+    with pytest.raises(ValueError):
+        Database.from_config()
+
+    config.database_url = DatabaseURL("sqlite://")
+    config.database_replica_urls = ["sqlite://"]
+    config.database_pool_pre_ping = True
+
+    db = Database.from_config()
+    assert str(db.engine.url) == "sqlite://"
+    assert db.engine.pool._pre_ping is True
+    assert len(db.replica_engines) == 1
+
+    db = Database.from_config(replica_urls=[])
+    assert db.replica_engines == []
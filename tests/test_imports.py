@@ -0,0 +1,40 @@
+import subprocess
+import sys
+
+import pytest
+
+import starlette_core
+
+
+def imported_after(code):
+    """The heavy dependencies imported by running the code in a new interpreter."""
+
+    script = (
+        f"import sys\n{code}\n"
+        "print(','.join(m for m in ('sqlalchemy', 'jinja2', 'wtforms') "
+        "if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, check=True, text=True
+    )
+    return result.stdout.strip()
+
+
+def test_package_import_is_lazy():
+    assert imported_after("import starlette_core") == ""
+    assert imported_after("from starlette_core import config") == ""
+    assert imported_after("from starlette_core import mail") == ""
+    assert imported_after("import starlette_core.database") == "sqlalchemy"
+    assert "jinja2" in imported_after(
+        "import starlette_core\nstarlette_core.templating"
+    )
+
+
+def test_submodules_load_on_first_use():
+    from starlette_core import database
+
+    assert starlette_core.database is database
+    assert "paginator" in dir(starlette_core)
+
+    with pytest.raises(AttributeError):
+        starlette_core.missing
@@ -1,9 +1,27 @@
+import asyncio
+import mailbox
+import queue
+import smtplib
+import time
 from email.message import EmailMessage
 
-from mock import call, patch
+import jinja2
+import pytest
+from mock import MagicMock, call, patch
 
-from starlette_core import config
-from starlette_core.mail import send_message
+from starlette_core import config, mail
+from starlette_core.mail import (
+    clear_default_connections,
+    get_default_connection,
+    send_fanout,
+    send_fanout_async,
+    send_message,
+    send_message_async,
+)
+from starlette_core.mail.backends import filebased, pooled_smtp, queued, smtp
+from starlette_core.mail.backends.base import BaseEmailBackend
+from starlette_core.mail.rendering import EmailRenderer
+from starlette_core.templating import Jinja2Templates
 
 
 def test_send_message():
@@ -54,3 +72,592 @@ def test_send_message():
         send_message(msg)
         instance = mock_smtp.return_value
         assert instance.send_message.call_count == 1
+
+
+def pooled_backend(**kwargs):
+    pooled_smtp._pools.clear()
+    return pooled_backend_instance(**kwargs)
+
+
+def pooled_backend_instance(**kwargs):
+    return pooled_smtp.EmailBackend(
+        host="mail", port=25, username="username", password="password", **kwargs
+    )
+
+
+def create_message():
+    msg = EmailMessage()
+    msg["Subject"] = "hello"
+    msg["To"] = "bar@mail.com"
+    msg["From"] = "foo@mail.com"
+    msg.set_content("hello peeps")
+    return msg
+
+
+def test_pooled_backend_reuses_connections():
+    backend = pooled_backend()
+
+    with patch("smtplib.SMTP") as mock_smtp:
+        assert backend.send_messages([create_message()]) == 1
+        assert backend.send_messages([create_message(), create_message()]) == 2
+        # another instance shares the pool
+        assert pooled_backend_instance().send_messages([create_message()]) == 1
+
+        instance = mock_smtp.return_value
+        assert mock_smtp.call_count == 1
+        assert instance.login.call_count == 1
+        assert instance.send_message.call_count == 4
+        instance.quit.assert_not_called()
+
+        backend.close_pool()
+        assert instance.quit.call_count == 1
+
+
+def test_pooled_backend_checks_idle_connections():
+    backend = pooled_backend(keepalive=10)
+
+    with patch("smtplib.SMTP") as mock_smtp:
+        instance = mock_smtp.return_value
+        instance.noop.return_value = (250, b"OK")
+
+        with patch("time.monotonic", return_value=100):
+            backend.send_messages([create_message()])
+        with patch("time.monotonic", return_value=105):
+            backend.send_messages([create_message()])
+        instance.noop.assert_not_called()
+
+        with patch("time.monotonic", return_value=200):
+            backend.send_messages([create_message()])
+        assert instance.noop.call_count == 1
+        assert mock_smtp.call_count == 1
+
+        # the server has gone away, so a new connection is made
+        instance.noop.side_effect = smtplib.SMTPServerDisconnected()
+        with patch("time.monotonic", return_value=300):
+            backend.send_messages([create_message()])
+        assert mock_smtp.call_count == 2
+
+
+def test_pooled_backend_reconnects():
+    backend = pooled_backend()
+
+    with patch("smtplib.SMTP") as mock_smtp:
+        instance = mock_smtp.return_value
+        instance.send_message.side_effect = [smtplib.SMTPServerDisconnected(), None]
+
+        assert backend.send_messages([create_message()]) == 1
+        assert mock_smtp.call_count == 2
+        assert instance.send_message.call_count == 2
+
+
+def test_pooled_backend_reconnect_fails():
+    backend = pooled_backend(pool_size=1)
+
+    with patch("smtplib.SMTP") as mock_smtp:
+        dropped, replacement = MagicMock(), MagicMock()
+        mock_smtp.side_effect = [dropped, replacement]
+        dropped.send_message.side_effect = smtplib.SMTPServerDisconnected()
+        replacement.send_message.side_effect = smtplib.SMTPServerDisconnected()
+
+        with pytest.raises(smtplib.SMTPServerDisconnected):
+            backend.send_messages([create_message()])
+
+        # the replacement is closed and the dropped connection isn't pooled
+        assert dropped.quit.call_count == 1
+        assert replacement.quit.call_count == 1
+        assert backend.pool._idle.empty()
+
+        # the replacement is kept if the server refuses the message
+        dropped, replacement = MagicMock(), MagicMock()
+        mock_smtp.side_effect = [dropped, replacement]
+        dropped.send_message.side_effect = smtplib.SMTPServerDisconnected()
+        replacement.send_message.side_effect = smtplib.SMTPRecipientsRefused({})
+
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            backend.send_messages([create_message()])
+
+        assert [c for c, _ in backend.pool._idle.queue] == [replacement]
+
+        # the slot is freed if reconnecting fails
+        backend.pool.close()
+        dropped = MagicMock()
+        mock_smtp.side_effect = [dropped, ConnectionRefusedError()]
+        dropped.send_message.side_effect = smtplib.SMTPServerDisconnected()
+
+        with pytest.raises(ConnectionRefusedError):
+            backend.send_messages([create_message()])
+
+        mock_smtp.side_effect = None
+        mock_smtp.return_value.send_message.side_effect = None
+        assert backend.send_messages([create_message()]) == 1
+
+
+def test_pooled_backend_keeps_connection_after_refused_recipient():
+    backend = pooled_backend()
+
+    with patch("smtplib.SMTP") as mock_smtp:
+        instance = mock_smtp.return_value
+        instance.send_message.side_effect = smtplib.SMTPRecipientsRefused({})
+
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            backend.send_messages([create_message()])
+
+        # the connection is returned to the pool and reused
+        instance.send_message.side_effect = None
+        assert backend.send_messages([create_message()]) == 1
+        assert mock_smtp.call_count == 1
+        instance.quit.assert_not_called()
+
+        # but not when the server has gone away
+        instance.send_message.side_effect = smtplib.SMTPServerDisconnected()
+        with pytest.raises(smtplib.SMTPServerDisconnected):
+            backend.send_messages([create_message()])
+        assert instance.quit.call_count == 2
+
+
+def test_pooled_backend_async():
+    backend = pooled_backend(pool_size=2)
+
+    with patch("smtplib.SMTP") as mock_smtp:
+
+        async def send():
+            sends = [send_message_async(create_message(), backend) for _ in range(5)]
+            return await asyncio.gather(*sends)
+
+        assert asyncio.run(send()) == [1, 1, 1, 1, 1]
+        assert mock_smtp.call_count <= 2
+        assert mock_smtp.return_value.send_message.call_count == 5
+
+
+def test_send_message_async():
+    config.email_backend = "starlette_core.mail.backends.smtp.EmailBackend"
+    config.email_host = "mail"
+    config.email_port = 25
+
+    with patch("smtplib.SMTP") as mock_smtp:
+        assert asyncio.run(send_message_async(create_message())) == 1
+        assert mock_smtp.return_value.send_message.call_count == 1
+
+
+class RecordingBackend(BaseEmailBackend):
+    # the subjects of the messages sent over each connection
+    batches: list = []
+    failures = 0
+    errors: dict = {}
+
+    def open(self):
+        if RecordingBackend.failures:
+            RecordingBackend.failures -= 1
+            raise smtplib.SMTPServerDisconnected()
+        RecordingBackend.batches.append([])
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            error = RecordingBackend.errors.get(message["Subject"])
+            if error is not None:
+                raise error
+            RecordingBackend.batches[-1].append(message["Subject"])
+        return len(email_messages)
+
+
+@pytest.fixture
+def recording_backend():
+    RecordingBackend.batches = []
+    RecordingBackend.failures = 0
+    RecordingBackend.errors = {}
+    return RecordingBackend
+
+
+def create_queue(store, **kwargs):
+    mail_queue = queued.MailQueue(RecordingBackend, store, **kwargs)
+    mail_queue.backoff = 0.01
+    return mail_queue
+
+
+def test_queued_backend_sends_in_batches(recording_backend):
+    mail_queue = create_queue(queued.MemoryQueue(100), batch_size=3)
+    backend = queued.EmailBackend(queue=mail_queue)
+
+    # hold the worker up until every message is queued
+    with mail_queue._idle:
+        messages = [create_message() for _ in range(5)]
+        assert backend.send_messages(messages) == 5
+
+    assert mail_queue.flush(timeout=5)
+    mail_queue.stop()
+
+    assert sum(len(batch) for batch in recording_backend.batches) == 5
+    assert max(len(batch) for batch in recording_backend.batches) <= 3
+    stats = mail_queue.stats()
+    assert stats["depth"] == 0
+    assert stats["sent"] == 5
+    assert stats["failed"] == 0
+    assert stats["send_latency"]["count"] == 5
+
+
+def test_queued_backend_retries(recording_backend):
+    recording_backend.failures = 2
+    mail_queue = create_queue(queued.MemoryQueue(100), max_retries=2)
+    queued.EmailBackend(queue=mail_queue).send_messages([create_message()])
+    assert mail_queue.flush(timeout=5)
+
+    assert mail_queue.stats()["retries"] == 2
+    assert mail_queue.stats()["sent"] == 1
+
+    # gives up after the last retry
+    recording_backend.failures = 3
+    queued.EmailBackend(queue=mail_queue).send_messages([create_message()])
+    assert mail_queue.flush(timeout=5)
+    mail_queue.stop()
+
+    assert mail_queue.stats()["sent"] == 1
+    assert mail_queue.stats()["failed"] == 1
+
+
+def test_queued_backend_only_retries_failed_messages(recording_backend):
+    recording_backend.errors = {
+        "refused": smtplib.SMTPRecipientsRefused({}),
+        "busy": smtplib.SMTPDataError(451, b"try again later"),
+    }
+    mail_queue = create_queue(queued.MemoryQueue(100), max_retries=2)
+
+    messages = [create_message() for _ in range(4)]
+    messages[1].replace_header("Subject", "refused")
+    messages[2].replace_header("Subject", "busy")
+    with mail_queue._idle:
+        queued.EmailBackend(queue=mail_queue).send_messages(messages)
+    assert mail_queue.flush(timeout=5)
+    mail_queue.stop()
+
+    # the refused message isn't retried and those sent aren't sent again
+    assert recording_backend.batches == [["hello", "hello"], [], []]
+    assert mail_queue.stats()["sent"] == 2
+    assert mail_queue.stats()["failed"] == 2
+    assert mail_queue.stats()["retries"] == 2
+
+
+def test_queued_backend_survives_backend_errors(recording_backend):
+    calls = []
+
+    def backend_factory():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError("misconfigured")
+        return RecordingBackend()
+
+    mail_queue = queued.MailQueue(backend_factory, queued.MemoryQueue(100))
+    mail_queue.backoff = 0.01
+    queued.EmailBackend(queue=mail_queue).send_messages([create_message()])
+    assert mail_queue.flush(timeout=5)
+    mail_queue.stop()
+
+    assert recording_backend.batches == [["hello"]]
+    assert mail_queue.stats()["retries"] == 1
+
+
+def test_queued_backend_full():
+    store = queued.MemoryQueue(1)
+    store.put(create_message())
+    mail_queue = queued.MailQueue(RecordingBackend, store)
+    mail_queue.start = lambda: None
+
+    with pytest.raises(queue.Full):
+        queued.EmailBackend(queue=mail_queue).send_messages([create_message()])
+    backend = queued.EmailBackend(queue=mail_queue, fail_silently=True)
+    assert backend.send_messages([create_message()]) == 0
+
+
+def test_sqlite_queue_is_durable(tmp_path, recording_backend):
+    path = str(tmp_path / "queue.db")
+    store = queued.SQLiteQueue(path, maxsize=2)
+    store.put(create_message())
+    store.put(create_message())
+    with pytest.raises(queue.Full):
+        store.put(create_message())
+
+    # taken but not acknowledged, so still there after a restart
+    assert len(store.get_batch(10, timeout=0)) == 2
+    assert store.get_batch(10, timeout=0) == []
+    store = queued.SQLiteQueue(path, maxsize=2)
+    assert store.depth() == 2
+
+    mail_queue = create_queue(store)
+    mail_queue.start()
+    assert mail_queue.flush(timeout=5)
+    mail_queue.stop()
+
+    assert recording_backend.batches == [["hello", "hello"]]
+    assert store.depth() == 0
+
+
+@pytest.mark.parametrize("durable", [False, True])
+def test_queued_backend_stop_keeps_unsent(tmp_path, recording_backend, durable):
+    if durable:
+        store = queued.SQLiteQueue(str(tmp_path / "queue.db"), maxsize=10)
+    else:
+        store = queued.MemoryQueue(10)
+    recording_backend.failures = 1
+    mail_queue = create_queue(store)
+    mail_queue.backoff = 60
+    queued.EmailBackend(queue=mail_queue).send_messages([create_message()])
+
+    # stopping doesn't wait for the retry, and the message isn't lost
+    while recording_backend.failures:
+        time.sleep(0.01)
+    start = time.monotonic()
+    mail_queue.stop(timeout=5)
+    assert time.monotonic() - start < 5
+    assert store.depth() == 1
+    assert mail_queue.stats()["failed"] == 0
+    assert not mail_queue.flush(timeout=0)
+
+    mail_queue.backoff = 0.01
+    mail_queue.start()
+    assert mail_queue.flush(timeout=5)
+    mail_queue.stop()
+
+    assert recording_backend.batches == [["hello"]]
+    assert store.depth() == 0
+
+
+class FlakyBackend(BaseEmailBackend):
+    opened: list = []
+
+    def open(self):
+        FlakyBackend.opened.append(self)
+
+    def send_messages(self, email_messages):
+        if email_messages[0]["Subject"] == "bad":
+            raise smtplib.SMTPRecipientsRefused({})
+        return len(email_messages)
+
+
+def test_send_fanout():
+    FlakyBackend.opened = []
+    messages = [create_message() for _ in range(10)]
+    messages[3].replace_header("Subject", "bad")
+
+    report = send_fanout(
+        messages, FlakyBackend, workers=2, max_messages_per_connection=2
+    )
+
+    assert len(report) == 10
+    assert report.num_sent == 9
+    assert [result.message for result in report] == messages
+    assert [result.message for result in report.failures] == [messages[3]]
+    assert isinstance(report.failures[0].error, smtplib.SMTPRecipientsRefused)
+    # 5 messages per worker reconnecting every 2, or after a failure
+    assert len(FlakyBackend.opened) == 6
+
+
+def test_send_fanout_rate_limit():
+    messages = [create_message() for _ in range(5)]
+
+    start = time.monotonic()
+    report = asyncio.run(
+        send_fanout_async(messages, connection_factory=FlakyBackend, rate_limit=50)
+    )
+
+    assert report.num_sent == 5
+    assert time.monotonic() - start >= 4 / 50
+
+
+email_templates = Jinja2Templates(
+    loader=jinja2.DictLoader(
+        {
+            "welcome.html": (
+                "{% block subject %}\n  Welcome {{ name }}\n{% endblock %}"
+                "{% block text %}Hi {{ name }}, from {{ site }}{% endblock %}"
+                "{% block html %}<p>Hello from <b>us</b></p>{% endblock %}"
+            ),
+            "html_only.html": "{% block html %}<p>{{ name }}</p>{% endblock %}",
+            "included.html": (
+                "{% block subject %}Hi{% endblock %}"
+                "{% block text %}{% include 'greeting.txt' %}{% endblock %}"
+                "{% block html %}"
+                "{% from 'macros.txt' import sign with context %}{{ sign() }}"
+                "{% endblock %}"
+            ),
+            "escaped.html": (
+                "{% block subject %}Tom & Jerry's {{ name }}{% endblock %}"
+                "{% block text %}{% include 'greeting.txt' %} & co{% endblock %}"
+                "{% block html %}<p>{{ name }} & co</p>{% endblock %}"
+            ),
+            "layout.html": (
+                "{% block subject %}News from {{ site }}{% endblock %}"
+                "{% block text %}{% block body %}{% endblock %}\n-- {{ site }}"
+                "{% endblock %}"
+                "{% block html %}<p>{% block body_html %}{% endblock %}</p>"
+                "{% endblock %}"
+            ),
+            "extends.html": (
+                "{% extends 'layout.html' %}"
+                "{% block subject %}{{ super() }}: {{ title }}{% endblock %}"
+                "{% block body %}Hi {{ name }}{% endblock %}"
+                "{% block body_html %}Hello {{ name }}{% endblock %}"
+            ),
+            "imports.html": (
+                "{% from 'macros.txt' import sign with context %}"
+                "{% set greeting = 'Hi' %}"
+                "{% block subject %}{{ greeting }} {{ name }}{% endblock %}"
+                "{% block text %}{{ sign() }}{% endblock %}"
+            ),
+            "greeting.txt": "Hello {{ name }}",
+            "macros.txt": "{% macro sign() %}From {{ site }}{% endmacro %}",
+        }
+    )
+)
+
+
+def test_render_message():
+    renderer = EmailRenderer(email_templates)
+
+    msg = renderer.render_message("welcome.html", {"name": "Ann", "site": "x"}, "a@b")
+    assert msg["Subject"] == "Welcome Ann"
+    assert msg["To"] == "a@b"
+    assert msg.get_body(("plain",)).get_content().strip() == "Hi Ann, from x"
+    assert "<b>us</b>" in msg.get_body(("html",)).get_content()
+
+    msg = renderer.render_message("html_only.html", {"name": "Ann"})
+    assert msg.get_content_type() == "text/html"
+    assert msg["To"] is None
+
+
+def test_render_messages_compiles_once():
+    renderer = EmailRenderer(email_templates)
+    recipients = [("a@b", {"name": "Ann"}), ("b@b", {"name": "Bob"})]
+
+    with patch.object(
+        email_templates.env, "get_template", wraps=email_templates.env.get_template
+    ) as get_template:
+        messages = renderer.render_messages("welcome.html", recipients, {"site": "x"})
+        renderer.render_messages("welcome.html", recipients, {"site": "x"})
+        assert get_template.call_count == 1
+
+    assert [msg["To"] for msg in messages] == ["a@b", "b@b"]
+    assert [msg["Subject"] for msg in messages] == ["Welcome Ann", "Welcome Bob"]
+    # the html block has no variables, so it is rendered once
+    assert renderer.get_template("welcome.html").static_blocks == {
+        "html": "<p>Hello from <b>us</b></p>"
+    }
+
+
+def test_render_messages_with_includes_and_macros():
+    renderer = EmailRenderer(email_templates)
+    recipients = [("a@b", {"name": "Ann"}), ("b@b", {"name": "Bob"})]
+
+    messages = renderer.render_messages("included.html", recipients, {"site": "x"})
+    assert [m.get_body(("plain",)).get_content() for m in messages] == [
+        "Hello Ann\n",
+        "Hello Bob\n",
+    ]
+    assert messages[0].get_body(("html",)).get_content() == "From x\n"
+    # only the subject is known not to use any variables
+    assert list(renderer.get_template("included.html").static_blocks) == ["subject"]
+
+
+def test_render_message_escapes_html_only():
+    renderer = EmailRenderer(email_templates)
+
+    msg = renderer.render_message("escaped.html", {"name": "O'Brien & Sons"})
+    assert msg["Subject"] == "Tom & Jerry's O'Brien & Sons"
+    assert msg.get_body(("plain",)).get_content() == "Hello O'Brien & Sons & co\n"
+    assert msg.get_body(("html",)).get_content() == (
+        "<p>O&#39;Brien &amp; Sons & co</p>\n"
+    )
+    # the shared template cache still has the autoescaped templates
+    assert "&amp;" in email_templates.get_template("escaped.html").render(name="&")
+
+
+def test_render_message_extends_layout():
+    renderer = EmailRenderer(email_templates)
+    context = {"name": "Ann & Bob", "site": "x", "title": "Launch"}
+
+    msg = renderer.render_message("extends.html", context)
+    assert msg["Subject"] == "News from x: Launch"
+    assert msg.get_body(("plain",)).get_content() == "Hi Ann & Bob\n-- x\n"
+    assert msg.get_body(("html",)).get_content() == "<p>Hello Ann &amp; Bob</p>\n"
+
+
+def test_render_message_with_top_level_imports():
+    renderer = EmailRenderer(email_templates)
+
+    messages = renderer.render_messages(
+        "imports.html",
+        [("a@b", {"name": "Ann"}), ("b@b", {"name": "Bob"})],
+        {"site": "x"},
+    )
+    assert [msg["Subject"] for msg in messages] == ["Hi Ann", "Hi Bob"]
+    assert messages[1].get_content() == "From x\n"
+    assert messages[1].get_content_type() == "text/plain"
+
+
+def test_renderer_requires_sync_templates():
+    with pytest.raises(ValueError):
+        EmailRenderer(
+            Jinja2Templates(loader=email_templates.env.loader, enable_async=True)
+        )
+
+
+def test_locmem_backend():
+    config.email_backend = "starlette_core.mail.backends.locmem.EmailBackend"
+    mail.outbox.clear()
+    msg = create_message()
+
+    try:
+        assert send_message(msg) == 1
+        assert mail.outbox == [msg]
+        assert mail.outbox[0] is msg
+    finally:
+        config.email_backend = "starlette_core.mail.backends.smtp.EmailBackend"
+        mail.outbox.clear()
+
+
+def test_filebased_backend(tmp_path):
+    path = str(tmp_path / "mail.mbox")
+    backend = filebased.EmailBackend(file_path=path, max_bytes=300, backup_count=2)
+
+    assert backend.send_messages([create_message(), create_message()]) == 2
+    messages = list(mailbox.mbox(path))
+    assert len(messages) == 2
+    assert messages[0]["Subject"] == "hello"
+    assert "hello peeps" in messages[0].get_payload()
+
+    # each message is about 200 bytes, so a file is rotated every 2 messages
+    for _ in range(5):
+        backend.send_messages([create_message()])
+    assert len(mailbox.mbox(path)) == 1
+    assert len(mailbox.mbox(path + ".1")) == 2
+    assert len(mailbox.mbox(path + ".2")) == 2
+    assert not (tmp_path / "mail.mbox.3").exists()
+
+
+def test_default_connection_is_shared():
+    clear_default_connections()
+    config.email_backend = "starlette_core.mail.backends.locmem.EmailBackend"
+
+    try:
+        connection = get_default_connection()
+        assert get_default_connection() is connection
+        assert get_default_connection(fail_silently=True) is not connection
+
+        # a new backend once the setting is changed
+        config.email_backend = "starlette_core.mail.backends.console.EmailBackend"
+        assert get_default_connection() is not connection
+    finally:
+        config.email_backend = "starlette_core.mail.backends.smtp.EmailBackend"
+        clear_default_connections()
+
+
+def test_smtp_backend_reads_config_when_sending():
+    config.email_host = "mail"
+    config.email_port = 25
+    backend = smtp.EmailBackend(port=2525)
+
+    with patch("smtplib.SMTP") as mock_smtp:
+        backend.send_messages([create_message()])
+        config.email_host = "othermail"
+        backend.send_messages([create_message()])
+
+    assert mock_smtp.call_args_list == [call("mail", 2525), call("othermail", 2525)]
+    config.email_host = "mail"
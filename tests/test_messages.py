@@ -4,10 +4,17 @@ from os.path import dirname, join, realpath
 import jinja2
 from starlette.applications import Starlette
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.responses import RedirectResponse
+from starlette.responses import PlainTextResponse, RedirectResponse
 from starlette.testclient import TestClient
 
-from starlette_core.messages import message
+from starlette_core import config
+from starlette_core.messages import (
+    CacheStorage,
+    Message,
+    SessionStorage,
+    get_messages,
+    message,
+)
 from starlette_core.templating import Jinja2Templates
 
 templates_directory = join(dirname(realpath(__file__)), "templates")
@@ -41,3 +48,115 @@ def test_message_in_template():
         response = client.get("/view")
         # once a message is consumed it should be removed
         assert """<p class="default">Hello World</p>""" not in unescape(response.text)
+
+
+class FakeRequest:
+    def __init__(self):
+        self.session = {}
+
+
+def test_messages_are_stored_compactly():
+    request = FakeRequest()
+    message(request, "a")
+    message(request, "b", "error")
+    message(request, "c", "custom")
+
+    assert request.session == {"_messages": [["a"], ["b", 5], ["c", "custom"]]}
+    assert get_messages(request) == [
+        Message("a", "default"),
+        Message("b", "error"),
+        Message("c", "custom"),
+    ]
+    assert request.session == {}
+
+
+def test_messages_read_the_old_format():
+    request = FakeRequest()
+    request.session["_messages"] = [{"message": "a", "category": "info"}]
+
+    (msg,) = get_messages(request)
+    assert (msg.message, msg.category) == ("a", "info")
+    assert (msg["message"], msg["category"]) == ("a", "info")
+
+
+def test_messages_are_evicted():
+    request = FakeRequest()
+    storage = SessionStorage()
+
+    for i in range(12):
+        storage.add(request, str(i), "info")
+    assert [m.message for m in storage.pop(request)] == [str(i) for i in range(2, 12)]
+
+    storage.max_size = 20
+    for i in range(3):
+        storage.add(request, "x" * 8, "info")
+    # each message is 14 bytes once encoded
+    assert len(storage.pop(request)) == 1
+
+
+def test_cache_storage():
+    config.messages_storage = "starlette_core.messages.CacheStorage"
+
+    try:
+        with TestClient(create_app()) as client:
+            response = client.get("/add")
+            assert """<p class="default">Hello World</p>""" in unescape(response.text)
+
+        request = FakeRequest()
+        message(request, "a")
+        assert list(request.session) == ["_messages_key"]
+        assert len(CacheStorage.cache) == 1
+        assert get_messages(request) == [Message("a")]
+        assert len(CacheStorage.cache) == 0
+        assert get_messages(request) == []
+    finally:
+        config.messages_storage = "starlette_core.messages.SessionStorage"
+
+
+class SpySession(dict):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.accessed = []
+
+    def __contains__(self, key):
+        self.accessed.append(("contains", key))
+        return super().__contains__(key)
+
+    def pop(self, *args):
+        self.accessed.append(("pop", args[0]))
+        return super().pop(*args)
+
+
+def test_get_messages_is_lazy():
+    request = FakeRequest()
+    request.session = SpySession()
+
+    messages = get_messages(request)
+    assert request.session.accessed == []
+
+    # nothing to read, so nothing is removed
+    assert not messages
+    assert request.session.accessed == [("contains", "_messages")]
+
+    request.session = SpySession({"_messages": [["a"]]})
+    messages = get_messages(request)
+    assert list(messages) == [Message("a")]
+    assert len(messages) == 1
+    assert request.session == {}
+
+
+def test_get_messages_within_a_request():
+    app = create_app()
+
+    @app.route("/check")
+    def check(request):
+        message(request, "Hello World")
+        # every call has the same messages
+        assert get_messages(request)
+        return PlainTextResponse(str(len(get_messages(request))))
+
+    with TestClient(app) as client:
+        assert client.get("/check").text == "1"
+        response = client.get("/view")
+        assert "Hello World" not in response.text
+        assert "set-cookie" not in response.headers
@@ -1,9 +1,18 @@
+import pytest
 from starlette.applications import Starlette
 from starlette.responses import JSONResponse
 from starlette.testclient import TestClient
 
 from starlette_core.database import Session
-from starlette_core.middleware import DatabaseMiddleware, get_request_id
+from starlette_core.middleware import (
+    CurrentRequestMiddleware,
+    DatabaseMiddleware,
+    get_leaked_session_count,
+    get_request,
+    get_request_id,
+)
+
+from .test_database import User
 
 
 def session_initialized(request):
@@ -17,10 +26,29 @@ def session_not_initialized(request):
     return JSONResponse({"has_session": has_session, "id": get_request_id()})
 
 
+def session_errored(request):
+    Session()
+    request.app.state.request_id = get_request_id()
+    raise RuntimeError("error")
+
+
+def session_uncommitted(request):
+    Session().add(User(name="ted"))
+    return JSONResponse({"id": get_request_id()})
+
+
+def current_request(request):
+    return JSONResponse({"path": get_request()["path"]})
+
+
 def create_app():
     app = Starlette()
     app.add_route("/session_initialized", session_initialized)
     app.add_route("/session_not_initialized", session_not_initialized)
+    app.add_route("/session_errored", session_errored)
+    app.add_route("/session_uncommitted", session_uncommitted)
+    app.add_route("/current_request", current_request)
+    app.add_middleware(CurrentRequestMiddleware)
     app.add_middleware(DatabaseMiddleware)
     return app
 
@@ -41,3 +69,44 @@ def test_database_middleware(db):
         assert json["has_session"]
         assert json["id"] is not None
         assert json["id"] not in Session.registry.registry
+
+
+def test_database_middleware_request_ids(db):
+    with TestClient(create_app()) as client:
+        first = client.get("/session_not_initialized").json()["id"]
+        second = client.get("/session_not_initialized").json()["id"]
+        assert isinstance(first, int)
+        assert second > first
+
+
+def test_database_middleware_removes_session_on_error(db):
+    app = create_app()
+    leaked = get_leaked_session_count()
+
+    with TestClient(app) as client:
+        with pytest.raises(RuntimeError):
+            client.get("/session_errored")
+
+    assert app.state.request_id not in Session.registry.registry
+    assert get_request_id() is None
+    assert get_leaked_session_count() == leaked + 1
+
+
+def test_database_middleware_counts_uncommitted_sessions(db):
+    db.create_all()
+    leaked = get_leaked_session_count()
+
+    with TestClient(create_app()) as client:
+        response = client.get("/session_uncommitted")
+        assert response.json()["id"] not in Session.registry.registry
+
+    assert get_leaked_session_count() == leaked + 1
+    assert User.query.count() == 0
+
+
+def test_current_request_middleware():
+    with TestClient(create_app()) as client:
+        response = client.get("/current_request")
+        assert response.json() == {"path": "/current_request"}
+
+    assert get_request() is None
@@ -0,0 +1,156 @@
+import logging
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.pool import QueuePool
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.testclient import TestClient
+
+from starlette_core.middleware import DatabaseMiddleware, get_query_stats
+from starlette_core.monitoring import (
+    Histogram,
+    NPlusOneDetector,
+    NPlusOneQueryError,
+    PoolStats,
+    fingerprint,
+    instrument_queries,
+)
+
+from .test_database import User
+
+
+def test_histogram():
+    histogram = Histogram([0.1, 1])
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+
+    assert histogram.snapshot() == {
+        "buckets": {"0.1": 2, "1": 1, "+Inf": 1},
+        "count": 4,
+        "sum": 2.65,
+        "max": 2,
+    }
+
+
+def test_pool_stats():
+    engine = sa.create_engine("sqlite://", poolclass=QueuePool, pool_size=2)
+    stats = PoolStats(engine)
+
+    with engine.connect() as conn:
+        conn.execute("SELECT 1")
+        snapshot = stats.snapshot()
+        assert snapshot["checked_out"] == 1
+        assert snapshot["overflow"] == -1
+        assert snapshot["size"] == 2
+
+    snapshot = stats.snapshot()
+    assert snapshot["pool"] == "QueuePool"
+    assert snapshot["checked_out"] == 0
+    assert snapshot["checkouts"] == 1
+    assert snapshot["connects"] == 1
+    assert snapshot["checkout_latency"]["count"] == 1
+    assert snapshot["connection_age"]["count"] == 1
+
+
+def test_database_health(db):
+    db.engine.execute("SELECT 1")
+
+    health = db.health()
+    assert health["primary"]["checkouts"] >= 1
+    assert health["replicas"] == []
+
+
+def test_slow_query_log(caplog):
+    engine = sa.create_engine("sqlite://")
+    instrument_queries(engine, slow_query_threshold=0)
+
+    with caplog.at_level(logging.WARNING, logger="starlette_core.database"):
+        engine.execute("SELECT 1")
+
+    assert "slow query" in caplog.text
+    assert "SELECT 1" in caplog.text
+
+
+def test_request_query_stats(db):
+    db.create_all()
+
+    def view(request):
+        User.query.count()
+        User.query.count()
+        return JSONResponse(get_query_stats().summary())
+
+    app = Starlette()
+    app.add_route("/", view)
+    app.add_middleware(DatabaseMiddleware)
+
+    with TestClient(app) as client:
+        summary = client.get("/").json()
+        assert summary["count"] == 2
+        assert summary["duration"] > 0
+
+    assert get_query_stats() is None
+
+
+def test_fingerprint():
+    assert fingerprint("SELECT * FROM user WHERE id = ?") == fingerprint(
+        "SELECT *\n FROM user WHERE id = 10"
+    )
+    assert (
+        fingerprint("SELECT * FROM user WHERE name = 'ted' AND id IN (?, ?, ?)")
+        == "SELECT * FROM user WHERE name = ? AND id IN (?)"
+    )
+    assert (
+        fingerprint("SELECT * FROM user WHERE id = %(id_1)s AND x::int = :x")
+        == "SELECT * FROM user WHERE id = ? AND x::int = ?"
+    )
+
+
+def detector_app(detector):
+    def view(request):
+        for i in range(3):
+            User.query.filter_by(id=i).first()
+        User.query.count()
+        return JSONResponse({})
+
+    app = Starlette()
+    app.add_route("/", view)
+    app.add_middleware(DatabaseMiddleware, detector=detector)
+    return app
+
+
+def test_n_plus_one_detector_log(db, caplog):
+    db.create_all()
+
+    with caplog.at_level(logging.WARNING, logger="starlette_core.database"):
+        with TestClient(detector_app(NPlusOneDetector(threshold=3))) as client:
+            response = client.get("/")
+
+    assert NPlusOneDetector.header_name not in response.headers
+    assert caplog.text.count("possible n+1 query, executed 3 times") == 1
+
+
+def test_n_plus_one_detector_raise(db):
+    db.create_all()
+
+    detector = NPlusOneDetector(threshold=3, action="raise")
+    with TestClient(detector_app(detector)) as client:
+        with pytest.raises(NPlusOneQueryError):
+            client.get("/")
+
+
+def test_n_plus_one_detector_header(db):
+    db.create_all()
+
+    detector = NPlusOneDetector(threshold=3, action="header")
+    with TestClient(detector_app(detector)) as client:
+        response = client.get("/")
+        assert response.headers[NPlusOneDetector.header_name] == "1"
+
+    detector = NPlusOneDetector(threshold=4, action="header")
+    with TestClient(detector_app(detector)) as client:
+        response = client.get("/")
+        assert NPlusOneDetector.header_name not in response.headers
+
+    with pytest.raises(ValueError):
+        NPlusOneDetector(action="email")
@@ -1,6 +1,24 @@
-import pytest
+import datetime
+import decimal
+import uuid
 
-from starlette_core.paginator import EmptyPage, InvalidPage, PageNotAnInteger, Paginator
+import pytest
+import sqlalchemy as sa
+from sqlalchemy_utils import UUIDType
+
+from starlette_core.cache import LocMemCache
+from starlette_core.database import Base
+from starlette_core.paginator import (
+    CachedCount,
+    CappedCount,
+    EmptyPage,
+    EstimatedCount,
+    InvalidCursor,
+    InvalidPage,
+    KeysetPaginator,
+    PageNotAnInteger,
+    Paginator,
+)
 
 
 def check_paginator(params, output):
@@ -122,6 +140,33 @@ def test_count_does_not_silence_type_error():
         Paginator(TypeErrorContainer(), 10).count()
 
 
+def test_count_is_only_calculated_once():
+    class CountContainer:
+        calls = 0
+
+        def count(self):
+            self.calls += 1
+            return 0
+
+    container = CountContainer()
+    paginator = Paginator(container, 10)
+    assert paginator.count == 0
+    assert paginator.count == 0
+    assert container.calls == 1
+
+
+def test_capped_count():
+    paginator = Paginator(list(range(25)), 10, count_strategy=CappedCount(20))
+    assert paginator.count == 20
+    assert paginator.count_is_exact is False
+    # pages beyond an approximate count can still be requested
+    assert paginator.page(3).object_list == [20, 21, 22, 23, 24]
+
+    paginator = Paginator(list(range(20)), 10, count_strategy=CappedCount(20))
+    assert paginator.count == 20
+    assert paginator.count_is_exact
+
+
 def test_get_page():
     """
     Paginator.get_page() returns a valid page even with invalid page
@@ -185,3 +230,254 @@ def test_page_attrs():
 
     with pytest.raises(EmptyPage):
         page.next_page_number
+
+
+class Item(Base):
+    name = sa.Column(sa.String(50))
+    rank = sa.Column(sa.Integer, nullable=False)
+
+
+def test_keyset_paginator(db):
+    db.create_all()
+    Item.bulk_save(Item(id=i, name=f"item {i}", rank=i % 3) for i in range(1, 11))
+
+    paginator = KeysetPaginator(Item.query, 4, [Item.rank.desc(), Item.id])
+
+    page = paginator.page()
+    assert [i.id for i in page] == [2, 5, 8, 1]
+    assert page.has_next
+    assert page.has_previous is False
+    assert page.previous_cursor is None
+
+    page = paginator.page(page.next_cursor)
+    assert [i.id for i in page] == [4, 7, 10, 3]
+    assert page.has_next
+    assert page.has_previous
+
+    page = paginator.page(page.next_cursor)
+    assert [i.id for i in page] == [6, 9]
+    assert page.has_next is False
+    assert page.next_cursor is None
+    assert page.has_other_pages
+
+    page = paginator.page(page.previous_cursor)
+    assert [i.id for i in page] == [4, 7, 10, 3]
+    assert page.has_next
+    assert page.has_previous
+
+    page = paginator.page(page.previous_cursor)
+    assert [i.id for i in page] == [2, 5, 8, 1]
+    assert page.has_previous is False
+
+
+def test_keyset_paginator_invalid_cursor(db):
+    db.create_all()
+    Item.bulk_save(Item(id=i, name=f"item {i}", rank=0) for i in range(1, 4))
+
+    paginator = KeysetPaginator(Item.query, 2, [Item.id])
+
+    with pytest.raises(InvalidCursor):
+        paginator.page("not a cursor")
+    with pytest.raises(InvalidCursor):
+        paginator.page(
+            KeysetPaginator(Item.query, 2, [Item.id, Item.rank]).encode_cursor([1, 2])
+        )
+    with pytest.raises(ValueError):
+        paginator.encode_cursor([1, 2])
+
+    # get_page falls back to the first page
+    page = paginator.get_page("not a cursor")
+    assert [i.id for i in page] == [1, 2]
+    assert repr(page) == "<KeysetPage of 2 items>"
+
+
+class Event(Base):
+    created = sa.Column(sa.DateTime, nullable=False)
+    day = sa.Column(sa.Date, nullable=False)
+
+
+def test_keyset_paginator_typed_keys(db):
+    db.create_all()
+    start = datetime.datetime(2020, 1, 1, 12, 30)
+    Event.bulk_save(
+        Event(
+            id=i,
+            created=start + datetime.timedelta(days=i % 3),
+            day=start.date() - datetime.timedelta(days=i),
+        )
+        for i in range(1, 6)
+    )
+
+    paginator = KeysetPaginator(Event.query, 2, [Event.created.desc(), Event.id])
+    page = paginator.page()
+    assert [e.id for e in page] == [2, 5]
+    page = paginator.page(page.next_cursor)
+    assert [e.id for e in page] == [1, 4]
+    page = paginator.page(page.previous_cursor)
+    assert [e.id for e in page] == [2, 5]
+
+    paginator = KeysetPaginator(Event.query, 3, [Event.day, Event.id])
+    page = paginator.page(paginator.page().next_cursor)
+    assert [e.id for e in page] == [2, 1]
+
+    # values are decoded by the type of their column
+    amount = sa.Column("amount", sa.Numeric(10, 2), nullable=False)
+    ident = sa.Column("ident", UUIDType(), nullable=False)
+    paginator = KeysetPaginator(Event.query, 2, [amount, ident])
+    values = [decimal.Decimal("1.10"), uuid.uuid4()]
+    assert paginator.decode_cursor(paginator.encode_cursor(values)) == (values, False)
+
+
+def test_keyset_paginator_invalid_cursor_values(db):
+    db.create_all()
+    Event(
+        id=1, created=datetime.datetime(2020, 1, 1), day=datetime.date(2020, 1, 1)
+    ).save()
+
+    paginator = KeysetPaginator(Event.query, 2, [Event.created, Event.id])
+    for values in (
+        [{"a": 1}, 1],
+        [[1], 1],
+        [None, 1],
+        ["not a date", 1],
+        ["2020-01-01", "1"],
+    ):
+        with pytest.raises(InvalidCursor):
+            paginator.page(paginator.encode_cursor(values))
+
+    page = paginator.get_page(paginator.encode_cursor([{"a": 1}, 1]))
+    assert [e.id for e in page] == [1]
+
+
+def test_keyset_paginator_nullable_keys():
+    with pytest.raises(ValueError):
+        KeysetPaginator(Item.query, 2, [Item.name, Item.id])
+
+
+def test_keyset_paginator_empty(db):
+    db.create_all()
+
+    page = KeysetPaginator(Item.query, 2, [Item.id]).page()
+    assert len(page) == 0
+    assert page.has_other_pages is False
+
+
+def test_capped_count_query(db):
+    db.create_all()
+    Item.bulk_save(Item(name=f"item {i}", rank=0) for i in range(15))
+
+    paginator = Paginator(Item.query, 10, count_strategy=CappedCount(10))
+    assert paginator.count == 10
+    assert paginator.count_is_exact is False
+
+
+def test_estimated_count_falls_back_to_exact(db):
+    db.create_all()
+    Item.bulk_save(Item(name=f"item {i}", rank=0) for i in range(5))
+
+    paginator = Paginator(Item.query, 10, count_strategy=EstimatedCount())
+    assert paginator.count == 5
+    assert paginator.count_is_exact
+
+
+def test_cached_count(db):
+    db.create_all()
+    Item.bulk_save(Item(name=f"item {i}", rank=i % 2) for i in range(5))
+
+    cache = LocMemCache()
+    strategy = CachedCount(timeout=60, cache=cache)
+
+    assert Paginator(Item.query.filter_by(rank=0), 2, strategy).count == 3
+    assert Paginator(Item.query.filter_by(rank=1), 2, strategy).count == 2
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    Item(name="another", rank=0).save()
+
+    # the same query and params are served from the cache
+    assert Paginator(Item.query.filter_by(rank=0), 2, strategy).count == 3
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # other object lists are not cached
+    assert Paginator([1, 2, 3], 2, strategy).count == 3
+    assert len(cache) == 2
+
+
+def test_cached_count_strategy_settings(db):
+    db.create_all()
+    Item.bulk_save(Item(name=f"item {i}", rank=0) for i in range(50))
+
+    cache = LocMemCache()
+    small = CachedCount(CappedCount(10), cache=cache)
+    large = CachedCount(CappedCount(1000), cache=cache)
+
+    # strategies with different settings are cached separately
+    assert Paginator(Item.query, 10, small).count == 10
+    assert Paginator(Item.query, 10, large).count == 50
+    assert len(cache) == 2
+
+
+def test_window_count(db):
+    db.create_all()
+    Item.bulk_save(Item(id=i, name=f"item {i}", rank=i % 2) for i in range(1, 6))
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sa.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    paginator = Paginator(Item.query.order_by(Item.id), 2, window_count=True)
+    page = paginator.page(2)
+    assert [i.id for i in page] == [3, 4]
+    assert page.has_next
+    assert paginator.count == 5
+    # the rows and count came from a single query
+    assert len(statements) == 1
+
+    # multiple entities are returned as tuples
+    query = Item.query.with_entities(Item.id, Item.name).order_by(Item.id)
+    page = Paginator(query, 2, window_count=True).page(3)
+    assert page.object_list == [(5, "item 5")]
+
+    sa.event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_window_count_distinct(db):
+    db.create_all()
+    Item.bulk_save(Item(name=f"item {i}", rank=i % 2) for i in range(5))
+
+    # count(*) OVER () would count the rows before DISTINCT
+    query = Item.query.with_entities(Item.rank).distinct().order_by(Item.rank)
+    paginator = Paginator(query, 1, window_count=True)
+    page = paginator.page(1)
+    assert paginator.count == 2
+    assert page.object_list == [(0,)]
+    assert page.has_next
+
+
+def test_window_count_empty_pages(db):
+    db.create_all()
+    Item.bulk_save(Item(id=i, name=f"item {i}", rank=0) for i in range(1, 4))
+
+    paginator = Paginator(Item.query.order_by(Item.id), 2, window_count=True)
+    with pytest.raises(EmptyPage):
+        paginator.page(3)
+    with pytest.raises(PageNotAnInteger):
+        paginator.page("x")
+
+    # out of range pages return the last page
+    paginator = Paginator(Item.query.order_by(Item.id), 2, window_count=True)
+    assert [i.id for i in paginator.get_page(10)] == [3]
+
+    # an empty first page has no results
+    paginator = Paginator(Item.query.filter_by(rank=1), 2, window_count=True)
+    page = paginator.page(1)
+    assert len(page) == 0
+    assert paginator.count == 0
+
+
+def test_window_count_non_query():
+    paginator = Paginator([1, 2, 3], 2, window_count=True)
+    assert paginator.page(2).object_list == [3]
+    assert paginator.count == 3
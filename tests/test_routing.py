@@ -0,0 +1,54 @@
+import pytest
+from starlette.routing import Mount, NoMatchFound, Route, Router
+
+from starlette_core.routing import RouteIndex, get_route_index
+
+
+def endpoint(request):
+    pass  # pragma: nocover
+
+
+router = Router(
+    routes=[
+        Route("/", endpoint, name="home"),
+        Route("/users/{id:int}", endpoint, name="user"),
+        Route("/users/{slug}", endpoint, name="user"),
+        Mount("/admin", routes=[Route("/", endpoint, name="index")], name="admin"),
+        Mount("/static", routes=[Route("/{path}", endpoint, name="file")]),
+    ]
+)
+
+
+def test_route_index():
+    index = RouteIndex(router)
+
+    for name, params in [
+        ("home", {}),
+        ("user", {"id": 1}),
+        ("user", {"slug": "ann"}),
+        ("admin:index", {}),
+        ("file", {"path": "app.css"}),
+    ]:
+        assert index.url_path_for(name, **params) == router.url_path_for(name, **params)
+
+    # only the routes that could match are tried
+    assert [route.path for route in index.get_routes("user")] == [
+        "/users/{id:int}",
+        "/users/{slug}",
+        "/static",
+    ]
+
+    with pytest.raises(NoMatchFound):
+        index.url_path_for("missing")
+
+
+def test_route_index_sees_new_routes():
+    router = Router(routes=[Route("/", endpoint, name="home")])
+    index = get_route_index(router)
+    assert get_route_index(router) is index
+
+    with pytest.raises(NoMatchFound):
+        index.url_path_for("about")
+
+    router.add_route("/about", endpoint, name="about")
+    assert index.url_path_for("about") == "/about"
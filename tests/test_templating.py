@@ -1,9 +1,24 @@
+import asyncio
+import pickle
 from os.path import dirname, join, realpath
 
 import jinja2
+import pytest
+from mock import patch
 from starlette import templating
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.testclient import TestClient
 
-from starlette_core.templating import Jinja2Templates
+import starlette_core.routing
+from starlette_core import config
+from starlette_core.cache import LocMemCache
+from starlette_core.fragment_cache import fragment_cache
+from starlette_core.templating import (
+    Jinja2Templates,
+    _StreamingTemplateResponse,
+    bytecode_cache,
+)
 
 templates_directory = join(dirname(realpath(__file__)), "templates")
 templates = Jinja2Templates(loader=jinja2.FileSystemLoader(templates_directory))
@@ -32,3 +47,207 @@ def test_env():
     assert "is_multipart" in templates.env.globals
     assert "url_params_update" in templates.env.globals
     assert "url_for" in templates.env.globals
+
+
+@pytest.fixture
+def bytecode_cache_config():
+    yield config
+    config.jinja2_bytecode_cache = ""
+    config.jinja2_bytecode_cache_dir = ""
+
+
+def test_no_bytecode_cache():
+    assert templates.env.bytecode_cache is None
+
+
+def test_memory_bytecode_cache(bytecode_cache_config):
+    config.jinja2_bytecode_cache = "memory"
+    bytecode_cache.clear()
+
+    loader = jinja2.FileSystemLoader(templates_directory)
+    assert Jinja2Templates(loader).precompile() == 3
+    assert len(bytecode_cache) == 3
+
+    # another environment loads the compiled templates
+    env = Jinja2Templates(loader).env
+    with patch.object(env, "compile", wraps=env.compile) as compile:
+        env.get_template("test1.html")
+        compile.assert_not_called()
+
+
+def test_filesystem_bytecode_cache(bytecode_cache_config, tmp_path):
+    config.jinja2_bytecode_cache = "filesystem"
+    config.jinja2_bytecode_cache_dir = str(tmp_path)
+
+    loader = jinja2.FileSystemLoader(templates_directory)
+    templates = Jinja2Templates(loader)
+    with patch.object(templates.env, "compile", wraps=templates.env.compile) as compile:
+        assert templates.precompile(processes=2) == 3
+        # the templates were compiled by the workers
+        compile.assert_not_called()
+    assert len(list(tmp_path.iterdir())) == 3
+
+    # errors in the workers are raised
+    loader = jinja2.FunctionLoader(lambda name: "")
+    with pytest.raises((AttributeError, pickle.PicklingError)):
+        Jinja2Templates(loader).precompile(["test.html"], processes=2)
+
+
+def test_invalid_bytecode_cache(bytecode_cache_config):
+    config.jinja2_bytecode_cache = "redis"
+
+    with pytest.raises(ValueError):
+        Jinja2Templates(loader=jinja2.FileSystemLoader(templates_directory))
+
+
+def test_streaming_template_response():
+    async_templates = Jinja2Templates(
+        loader=jinja2.DictLoader(
+            {"rows.html": "{% for i in range(rows) %}<p>{{ i }}</p>{% endfor %}"}
+        ),
+        enable_async=True,
+    )
+    app = Starlette()
+    sent = []
+
+    @app.route("/")
+    async def rows(request):
+        return async_templates.StreamingTemplateResponse(
+            "rows.html", {"request": request, "rows": 1000}
+        )
+
+    async def recording_app(scope, receive, send):
+        async def record(message):
+            if message["type"] == "http.response.body":
+                sent.append(message["body"])
+            await send(message)
+
+        await app(scope, receive, record)
+
+    response = TestClient(recording_app).get("/")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/html; charset=utf-8"
+    assert response.text == "".join(f"<p>{i}</p>" for i in range(1000))
+    assert response.template.name == "rows.html"
+    # sent in chunks of at least the chunk size
+    sent = [chunk for chunk in sent if chunk]
+    assert len(sent) > 1
+    assert all(
+        len(chunk) >= _StreamingTemplateResponse.chunk_size for chunk in sent[:-1]
+    )
+
+
+def test_async_template_response():
+    async_templates = Jinja2Templates(
+        loader=jinja2.DictLoader({"hello.html": "Hello {{ name }}"}),
+        enable_async=True,
+    )
+    app = Starlette()
+
+    @app.route("/")
+    async def hello(request):
+        response = async_templates.TemplateResponse(
+            "hello.html", {"request": request, "name": "ann"}, status_code=201
+        )
+        response.set_cookie("seen", "1")
+        return response
+
+    response = TestClient(app).get("/")
+    assert response.status_code == 201
+    assert response.text == "Hello ann"
+    assert response.headers["content-length"] == "9"
+    assert response.cookies["seen"] == "1"
+    assert response.template.name == "hello.html"
+
+
+def test_streaming_template_response_requires_async():
+    with pytest.raises(RuntimeError):
+        templates.StreamingTemplateResponse("test1.html", {"request": {}})
+
+
+def fragment_templates(enable_async=False):
+    return Jinja2Templates(
+        loader=jinja2.DictLoader(
+            {
+                "nav.html": (
+                    "{% cache 'nav', ttl, user %}{{ user }}:{{ render() }}"
+                    "{% endcache %}"
+                ),
+                "default.html": "{% cache 'default' %}{{ render() }}{% endcache %}",
+            }
+        ),
+        enable_async=enable_async,
+    )
+
+
+def test_fragment_cache():
+    fragment_cache.clear()
+    env = fragment_templates().env
+    calls = []
+
+    def render():
+        calls.append(1)
+        return "<b>"
+
+    template = env.get_template("nav.html")
+    assert template.render(user="ann", ttl=60, render=render) == "ann:&lt;b&gt;"
+    assert template.render(user="ann", ttl=60, render=render) == "ann:&lt;b&gt;"
+    assert len(calls) == 1
+
+    # varies by user
+    assert template.render(user="bob", ttl=60, render=render) == "bob:&lt;b&gt;"
+    assert len(calls) == 2
+
+    with patch("time.monotonic", return_value=10**9):
+        template.render(user="ann", ttl=60, render=render)
+    assert len(calls) == 3
+
+    env.get_template("default.html").render(render=render)
+    assert len(calls) == 4
+
+
+def test_fragment_cache_async():
+    env = fragment_templates(enable_async=True).env
+    env.fragment_cache = LocMemCache()
+    template = env.get_template("nav.html")
+
+    async def render():
+        return "<b>"
+
+    async def render_twice():
+        return [
+            await template.render_async(user="ann", ttl=None, render=render)
+            for _ in range(2)
+        ]
+
+    assert asyncio.run(render_twice()) == ["ann:&lt;b&gt;", "ann:&lt;b&gt;"]
+    assert (env.fragment_cache.hits, env.fragment_cache.misses) == (1, 1)
+
+
+def test_url_helpers_are_memoized():
+    env = Jinja2Templates(
+        loader=jinja2.DictLoader(
+            {
+                "links.html": (
+                    "{% for i in range(3) %}"
+                    "{{ url_for('user', id=1) }} "
+                    "?{{ url_params_update(request.query_params, page=2) }} "
+                    "{% endfor %}"
+                )
+            }
+        )
+    ).env
+    app = Starlette()
+
+    @app.route("/users/{id:int}")
+    async def user(request):
+        return PlainTextResponse(env.get_template("links.html").render(request=request))
+
+    with patch(
+        "starlette_core.routing.url_for", wraps=starlette_core.routing.url_for
+    ) as url_for:
+        response = TestClient(app).get("/users/1?page=1&q=a")
+        assert url_for.call_count == 1
+
+    links = ["http://testserver/users/1", "?page=2&amp;q=a"]
+    assert response.text.split() == links * 3
@@ -0,0 +1,43 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.testclient import TestClient
+
+from starlette_core.middleware import DatabaseMiddleware
+from starlette_core.testing import assert_max_queries
+
+from .test_database import User
+
+
+def test_assert_max_queries(db):
+    db.create_all()
+
+    with assert_max_queries(2) as stats:
+        User.query.count()
+        User.query.count()
+    assert stats.count == 2
+
+    with pytest.raises(AssertionError) as e:
+        with assert_max_queries(1):
+            User.query.count()
+            User.query.count()
+    assert "2 queries executed, expected at most 1" in str(e.value)
+    assert "2x SELECT count(*)" in str(e.value)
+
+
+def test_assert_max_queries_test_client(db):
+    db.create_all()
+
+    def view(request):
+        User.query.count()
+        return JSONResponse({})
+
+    app = Starlette()
+    app.add_route("/", view)
+    app.add_middleware(DatabaseMiddleware)
+
+    with TestClient(app) as client:
+        with pytest.raises(AssertionError):
+            with assert_max_queries(1):
+                client.get("/")
+                client.get("/")
@@ -0,0 +1,32 @@
+import pytest
+
+from starlette_core.utils import (
+    cached_import_string,
+    chunked,
+    clear_import_cache,
+    import_string,
+)
+
+
+def test_import_string():
+    assert import_string("starlette_core.utils.chunked") is chunked
+
+    with pytest.raises(ImportError):
+        import_string("chunked")
+    with pytest.raises(ImportError):
+        import_string("starlette_core.utils.missing")
+
+
+def test_cached_import_string():
+    clear_import_cache()
+
+    assert cached_import_string("starlette_core.utils.chunked") is chunked
+    assert cached_import_string("starlette_core.utils.chunked") is chunked
+    assert cached_import_string.cache_info().hits == 1
+
+    clear_import_cache()
+    assert cached_import_string.cache_info().currsize == 0
+
+    with pytest.raises(ImportError):
+        cached_import_string("starlette_core.utils.missing")
+    assert cached_import_string.cache_info().currsize == 0